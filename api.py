@@ -1,7 +1,7 @@
 import os
 import json
 import logging
-from datetime import date
+from datetime import date, datetime, timedelta
 from typing import List, Optional, Dict
 
 from fastapi import FastAPI, HTTPException, Query
@@ -12,6 +12,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from config import OUTPUT_DIR, ZM_CACHE_DIR
 from stats import _load_stats # Importa a função interna para reuso
 from db import get_camera_groups # Reutiliza a função de busca de grupos
+from rollups import get_store, align, LEVELS # Série temporal incremental das estatísticas
 
 # --- Configuração Inicial ---
 app = FastAPI(
@@ -85,6 +86,16 @@ def get_status():
 def get_monthly_stats(year: str, month: str):
     """Retorna as estatísticas consolidadas para um dado mês/ano."""
     month_num = str(int(month))
+
+    # Rollup: um registro por dimensão, sem ler arquivo de dia nenhum
+    try:
+        from_rollup = get_store().month_summary(year, month)
+    except Exception as e:
+        log.error(f"Erro ao consultar o rollup: {e}")
+        from_rollup = None
+    if from_rollup is not None:
+        return from_rollup
+
     summary_path = os.path.join(OUTPUT_DIR, 'Stats', year, month_num, f"{year}_{month_num}_summary.json")
     
     if not os.path.exists(summary_path):
@@ -109,6 +120,57 @@ def get_monthly_stats(year: str, month: str):
         raise HTTPException(status_code=500, detail="Could not read stats file.")
 
 
+@app.get("/api/stats/range", response_model=Dict)
+def get_range_stats(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    camera_id: Optional[int] = None,
+    group: Optional[str] = None,
+    label: Optional[str] = None,
+    granularity: Optional[str] = Query(None, description="hour, day, month ou year: inclui a série por balde")
+):
+    """
+    Totais de um intervalo qualquer [start, end) a partir do rollup (padrão: as últimas 24
+    horas inteiras, incluindo a hora corrente). Os baldes são por hora: o intervalo é
+    estendido às horas inteiras que o contêm e a resposta traz esses limites efetivos.
+    Filtra por câmera, grupo ou label; com `granularity`, devolve também a série.
+    Ex.: semana contra semana = duas chamadas com intervalos de 7 dias.
+    """
+    # O rollup é em hora local sem fuso: converte datas com fuso (ex.: ...Z) antes de comparar
+    if end is not None and end.tzinfo is not None:
+        end = end.astimezone().replace(tzinfo=None)
+    if start is not None and start.tzinfo is not None:
+        start = start.astimezone().replace(tzinfo=None)
+    now = datetime.now()
+    end = end or align(now, now)[1]
+    start = start or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end.")
+    start, end = align(start, end)
+    if granularity and granularity not in LEVELS:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(LEVELS)}.")
+
+    dim, key = "*", "*"
+    if camera_id is not None:
+        dim, key = "camera", str(camera_id)
+    elif group:
+        dim, key = "grupo", group
+    elif label:
+        dim, key = "label", label
+
+    try:
+        store = get_store()
+        result = store.query(start, end, dim, key)
+        if granularity:
+            result["serie"] = store.series(start, end, granularity, dim, key)
+    except Exception as e:
+        log.error(f"Erro ao consultar o rollup: {e}")
+        raise HTTPException(status_code=500, detail="Could not read stats rollup.")
+
+    result.update({"start": start.isoformat(), "end": end.isoformat(), "dimensao": dim, "chave": key})
+    return result
+
+
 @app.get("/api/events", response_model=List[Event])
 def get_events(
     event_date: date,
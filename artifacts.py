@@ -0,0 +1,109 @@
+import os
+import grp
+import pwd
+import queue
+import shutil
+import logging
+import subprocess
+import threading
+from config import ARTIFACT_OWNER, ARTIFACT_CHOWN_BATCH
+from retention import record_artifact, forget_artifacts
+
+class ArtifactWriter:
+    """
+    Grava recortes e frames em background. A thread de inferência só enfileira;
+    a codificação, a escrita atômica (tmp + rename) e o ajuste de dono acontecem
+    aqui. O chown é feito em lote: in-process quando rodando como root, senão um
+    único `sudo chown` por lote em vez de um por arquivo.
+    """
+
+    def __init__(self, owner=ARTIFACT_OWNER, batch=ARTIFACT_CHOWN_BATCH):
+        self.owner    = owner
+        self.batch    = batch
+        self.queue    = queue.Queue()
+        self._pending = []
+        self._ids     = self._resolve_owner(owner) if owner and os.geteuid() == 0 else None
+        self._thread  = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _resolve_owner(owner):
+        user, _, group = owner.partition(":")
+        uid = pwd.getpwnam(user).pw_uid if user else -1
+        gid = grp.getgrnam(group).gr_gid if group else -1
+        return uid, gid
+
+    def save_bytes(self, path, data, description=None):
+        self.queue.put(("bytes", path, data, description))
+
+    def save_crop(self, path, frame, box, description=None):
+        """`frame` é um PreparedFrame: a decodificação em resolução total também sai da thread de inferência."""
+        self.queue.put(("crop", path, (frame, box), description))
+
+    def remove_tree(self, path):
+        """Remove a pasta depois das gravações já enfileiradas para ela."""
+        self.queue.put(("rmtree", path, None, None))
+
+    def flush(self):
+        self.queue.join()
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def _run(self):
+        while True:
+            kind, path, payload, description = self.queue.get()
+            try:
+                if kind == "rmtree":
+                    # Recortes dessa pasta ainda pendentes de chown não existem mais
+                    self._pending = [p for p in self._pending if not p.startswith(path + os.sep)]
+                    shutil.rmtree(path, ignore_errors=True)
+                    forget_artifacts(path)
+                else:
+                    self._write(kind, path, payload)
+                    self._pending.append(path)
+                    if description:
+                        logging.info(f"{description}: {path}")
+            except Exception:
+                logging.exception(f"Erro ao gravar artefato {path}")
+            finally:
+                if self._pending and (self.queue.empty() or len(self._pending) >= self.batch):
+                    self._apply_owner()
+                self.queue.task_done()
+
+    def _write(self, kind, path, payload):
+        folder, name = os.path.split(path)
+        tmp_path = os.path.join(folder, f".{name}.tmp")
+        if kind == "bytes":
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+        else:
+            frame, box = payload
+            frame.full_image().crop(box).save(tmp_path, "JPEG")
+        os.replace(tmp_path, path)
+        record_artifact(path, os.path.getsize(path))
+
+    def _apply_owner(self):
+        paths, self._pending = self._pending, []
+        if not self.owner:
+            return
+        if self._ids is not None:
+            for path in paths:
+                try:
+                    os.chown(path, *self._ids)
+                except OSError:
+                    logging.exception(f"Falha no chown de {path}")
+            return
+        existing = [p for p in paths if os.path.exists(p)]
+        if existing:
+            subprocess.run(["sudo", "chown", self.owner, *existing], check=False)
+
+_writer      = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ArtifactWriter()
+        return _writer
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import argparse
+from frames import PreparedFrame
+from detectors import DeepStackDetector
+
+# --- BENCHMARK: UM FRAME POR REQUISIÇÃO x MOSAICO ---
+# Roda os mesmos frames contra o DeepStack configurado (DEEPSTACK_ADDRS) nos dois
+# modos e compara frames/s e quantidade de detecções.
+# Ex: python bench_mosaic.py /media/.../Events_ZM/11/2025-07-28/123456 --limit 200
+
+def load_frames(folder, limit):
+    names = sorted(f for f in os.listdir(folder) if f.endswith(".jpg"))[:limit]
+    return [PreparedFrame(os.path.join(folder, name)) for name in names]
+
+def run(detector, frames):
+    started = time.perf_counter()
+    detections = failures = 0
+    for start in range(0, len(frames), detector.batch_size):
+        for predictions in detector.detect(frames[start:start + detector.batch_size]):
+            if predictions is None:
+                failures += 1
+            else:
+                detections += len(predictions)
+    elapsed = time.perf_counter() - started
+    return elapsed, detections, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara DeepStack um-frame-por-requisição com mosaico.")
+    parser.add_argument("folder", help="pasta com frames .jpg (ex.: pasta de um evento do ZM)")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--grid", type=int, nargs=2, default=[2, 2], metavar=("COLS", "ROWS"))
+    parser.add_argument("--tile", type=int, default=416)
+    args = parser.parse_args()
+
+    frames = load_frames(args.folder, args.limit)
+    if not frames:
+        print(f"❌ Nenhum .jpg em {args.folder}")
+        sys.exit(1)
+
+    # Pré-gera os uploads para medir só a inferência no modo individual
+    for frame in frames:
+        frame.upload
+
+    modes = [
+        ("1 frame/requisição", DeepStackDetector(mosaic=False)),
+        (f"mosaico {args.grid[0]}x{args.grid[1]} ({args.tile}px)", DeepStackDetector(mosaic=True, grid=tuple(args.grid), tile=args.tile)),
+    ]
+    print(f"--- {len(frames)} frames de {args.folder} ---")
+    for name, detector in modes:
+        elapsed, detections, failures = run(detector, frames)
+        print(f"{name:32s} {len(frames) / elapsed:7.2f} frames/s  {elapsed:7.2f}s  detecções: {detections}  falhas: {failures}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from config import ZM_CACHE_DIR, MAX_EVENT_AGE_MINUTES, EVENT_DISCOVERY, CATCHUP_WORKERS
+from db import db_cursor
+
+def _scan_camera(camera_id, date_str, cutoff):
+    """Eventos recentes na pasta de hoje de uma câmera: [(camera, data, evento, mtime)]."""
+    day_path = os.path.join(ZM_CACHE_DIR, str(camera_id), date_str)
+    found = []
+    try:
+        with os.scandir(day_path) as it:
+            for entry in it:
+                if entry.is_dir() and entry.name.isdigit():
+                    mtime = entry.stat().st_mtime
+                    if mtime >= cutoff:
+                        found.append((camera_id, date_str, int(entry.name), mtime))
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logging.exception(f"Catch-up: erro ao listar {day_path}")
+    return found
+
+def _from_filesystem(monitor_ids, cutoff):
+    date_str = time.strftime("%Y-%m-%d")
+    with ThreadPoolExecutor(max_workers=CATCHUP_WORKERS) as pool:
+        results = pool.map(lambda cam: _scan_camera(cam, date_str, cutoff), monitor_ids)
+    return [(cam, day, evt, None, mtime) for found in results for cam, day, evt, mtime in found]
+
+def _from_database(monitor_ids, cutoff):
+    placeholders = ", ".join(["%s"] * len(monitor_ids))
+    with db_cursor(dictionary=True) as cursor:
+        cursor.execute(f"""
+            SELECT Id, MonitorId, StartDateTime
+              FROM Events
+             WHERE StartDateTime >= %s AND MonitorId IN ({placeholders})
+        """, (datetime.fromtimestamp(cutoff), *monitor_ids))
+        rows = cursor.fetchall()
+    return [
+        (row["MonitorId"], row["StartDateTime"].strftime("%Y-%m-%d"), row["Id"], row["StartDateTime"], row["StartDateTime"].timestamp())
+        for row in rows
+    ]
+
+def find_missed_events(monitor_ids, processed_events, source=EVENT_DISCOVERY):
+    """Eventos mais novos que MAX_EVENT_AGE_MINUTES ainda não processados, do mais novo para o mais velho."""
+    if not monitor_ids:
+        return []
+    cutoff = time.time() - MAX_EVENT_AGE_MINUTES * 60
+    candidates = _from_database(monitor_ids, cutoff) if source == "database" else _from_filesystem(monitor_ids, cutoff)
+    missed = [c for c in candidates if (str(c[0]), str(c[2])) not in processed_events]
+    missed.sort(key=lambda c: c[4], reverse=True)
+    return missed
+
+def run_catchup(pipeline, monitor_ids, processed_events):
+    started = time.time()
+    try:
+        missed = find_missed_events(monitor_ids, processed_events)
+    except Exception:
+        logging.exception("Catch-up: falha ao procurar eventos perdidos.")
+        return
+
+    queued = 0
+    for camera_id, date_str, event_id, start_time, _ in missed:
+        if pipeline.submit(camera_id, date_str, event_id, start_time=start_time, block=True):
+            queued += 1
+    logging.info(f"🔁 Catch-up: {queued} eventos perdidos enfileirados ({len(missed)} encontrados em {time.time() - started:.1f}s).")
+
+def start_catchup(pipeline, monitor_ids, processed_events):
+    """Roda o catch-up em paralelo ao monitoramento ao vivo, que já deve estar ativo."""
+    thread = threading.Thread(target=run_catchup, args=(pipeline, monitor_ids, processed_events), name="catchup", daemon=True)
+    thread.start()
+    return thread
@@ -1,144 +1,263 @@
 import os
 import time
 import logging
-import shutil
+import threading
+import subprocess
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-from config import OUTPUT_DIR, ZM_CACHE_DIR, CLEANUP_RETENTION_DAYS, JSONErrorHandler 
+from config import OUTPUT_DIR, ZM_CACHE_DIR, CLEANUP_RETENTION_DAYS, CLEANUP_INTERVAL_MINUTES, CLEANUP_WORKERS, \
+    CLEANUP_MAX_SECONDS, CLEANUP_MAX_INODES, CLEANUP_YIELD_SECONDS, JSONErrorHandler, LOG_LISTENER
 
-def run_cleanup():
+class CleanupRun:
+    """
+    Estado de uma execução: o que foi liberado e o orçamento (tempo total e inodes
+    apagados). Quando o orçamento acaba, as remoções restantes ficam para a próxima
+    rodada. `should_yield` (ex.: fila de eventos cheia) pausa as remoções para não
+    disputar disco com a inferência.
+    """
+
+    def __init__(self, max_seconds=CLEANUP_MAX_SECONDS, max_inodes=CLEANUP_MAX_INODES, should_yield=None, on_removed=None):
+        self.started      = time.monotonic()
+        self.on_removed   = on_removed  # ex.: índice de uso da retenção
+        self.max_seconds  = max_seconds
+        self.max_inodes   = max_inodes
+        self.should_yield = should_yield
+        self.lock         = threading.Lock()
+        self.bytes        = 0
+        self.inodes       = 0
+        self.trees        = 0
+        self.denied       = []  # pastas sem permissão, removidas com um único sudo no final
+
+    @property
+    def exhausted(self):
+        return (time.monotonic() - self.started >= self.max_seconds
+                or (self.max_inodes and self.inodes >= self.max_inodes))
+
+    def wait_turn(self):
+        """Espera enquanto a inferência está sob pressão; False se o orçamento acabou."""
+        while self.should_yield and self.should_yield() and not self.exhausted:
+            time.sleep(CLEANUP_YIELD_SECONDS)
+        return not self.exhausted
+
+    def freed(self, size, inodes=1):
+        with self.lock:
+            self.bytes  += size
+            self.inodes += inodes
+
+    def removed(self, path):
+        with self.lock:
+            self.trees += 1
+        if self.on_removed:
+            self.on_removed(path)
+
+    def finish(self):
+        """Remove de uma vez as pastas que precisaram de sudo."""
+        _sudo_remove(self)
+
+class _BudgetExhausted(Exception):
+    """Orçamento acabou no meio de uma árvore: o resto fica para a próxima rodada."""
+
+_CHECK_EVERY = 64  # entradas apagadas entre consultas ao orçamento/should_yield
+
+def _remove_tree(path, run):
+    """rmtree in-process contando bytes e inodes liberados (lstat vem do DirEntry)."""
+    st = os.stat(path, follow_symlinks=False)
+    with os.scandir(path) as it:
+        entries = list(it)
+    try:
+        for count, entry in enumerate(entries):
+            if count % _CHECK_EVERY == 0 and not run.wait_turn():
+                raise _BudgetExhausted(path)
+            if entry.is_dir(follow_symlinks=False):
+                _remove_tree(entry.path, run)
+            else:
+                size = entry.stat(follow_symlinks=False).st_size
+                os.unlink(entry.path)
+                run.freed(size)
+    except _BudgetExhausted:
+        # Apagar entradas muda o mtime da pasta; restaura para a idade continuar valendo na próxima rodada
+        try:
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+        except OSError:
+            pass
+        raise
+    os.rmdir(path)
+    run.freed(0)
+
+def _tree_usage(path):
+    size = inodes = 0
+    for root, dirs, files in os.walk(path):
+        inodes += len(dirs) + len(files)
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size, inodes + 1
+
+def _delete_tree(path, run, description):
+    if not run.wait_turn():
+        return
+    try:
+        logging.warning(f"🧹 {description}: {path}")
+        _remove_tree(path, run)
+        run.removed(path)
+    except _BudgetExhausted:
+        logging.info(f"Orçamento da limpeza esgotado no meio de {path}; continua na próxima rodada.")
+    except PermissionError:
+        with run.lock:
+            run.denied.append(path)
+    except FileNotFoundError:
+        # Já removida por fora (ex.: purge do próprio ZM): tira do índice de uso mesmo assim
+        if not os.path.exists(path) and run.on_removed:
+            run.on_removed(path)
+    except Exception:
+        logging.exception(f"Falha ao deletar pasta {path}.")
+
+def _delete_file(entry, run):
+    if not run.wait_turn():
+        return
+    try:
+        size = entry.stat(follow_symlinks=False).st_size
+        logging.warning(f"🧹 Deletando arquivo de log JSON: {entry.path}")
+        os.unlink(entry.path)
+        run.freed(size)
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.exception(f"Falha ao deletar arquivo {entry.path}.")
+
+def _scan_dirs(path):
+    """Subpastas de `path` (DirEntry, com stat em cache); vazio se a pasta não existe."""
+    try:
+        with os.scandir(path) as it:
+            return [entry for entry in it if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+
+def _collect_output(base_dir, delete_date, delete_time, tasks):
+    # --- 1. OUTPUT_DIR: pastas diárias (DD-MM-YYYY) e logs JSON antigos dentro de ID_camera ---
+    for daily in _scan_dirs(base_dir):
+        if daily.name == 'Stats':
+            continue
+        try:
+            folder_date = datetime.strptime(daily.name, "%d-%m-%Y")
+        except ValueError:
+            continue  # não é pasta de data (ex.: ID_camera, tratada abaixo)
+        if folder_date.date() < delete_date.date():
+            tasks.append(("tree", daily.path, "Deletando pasta de log diário completa"))
+            continue
+        for cam in _scan_dirs(daily.path):
+            if not cam.name.startswith('ID_'):
+                continue
+            with os.scandir(cam.path) as it:
+                for entry in it:
+                    if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < delete_time:
+                        tasks.append(("file", entry, None))
+
+    # --- 2. OUTPUT_DIR: pastas de evento (imagens DeepStack) em ID_CAMERA/EVENTO_ID ---
+    for cam in _scan_dirs(base_dir):
+        if not cam.name.startswith('ID_'):
+            continue
+        for event in _scan_dirs(cam.path):
+            if event.stat(follow_symlinks=False).st_mtime < delete_time:
+                tasks.append(("tree", event.path, "Deletando pasta de evento (imagens DeepStack)"))
+
+def _collect_zm_cache(zm_events_base, delete_date, tasks):
+    # --- 3. Cache do ZoneMinder (ZM_CACHE_DIR/events/<camera>/<YYYY-MM-DD>) ---
+    for cam in _scan_dirs(zm_events_base):
+        if not cam.name.isdigit():
+            continue
+        for day in _scan_dirs(cam.path):
+            try:
+                folder_date = datetime.strptime(day.name, "%Y-%m-%d")
+            except ValueError:
+                continue
+            if folder_date.date() < delete_date.date():
+                tasks.append(("tree", day.path, f"ZM Cache: Deletando pasta de data antiga (Câmera {cam.name})"))
+
+def _sudo_remove(run):
+    """Pastas do ZM sem permissão para o usuário do daemon: um único `sudo rm -rf` para todas."""
+    if not run.denied:
+        return
+    usage = [_tree_usage(path) for path in run.denied]
+    result = subprocess.run(["sudo", "rm", "-rf", "--", *run.denied], check=False)
+    if result.returncode == 0:
+        run.freed(sum(u[0] for u in usage), sum(u[1] for u in usage))
+        for path in run.denied:
+            run.removed(path)
+    else:
+        logging.error(f"ZM Cache: sudo rm falhou (código {result.returncode}) para {len(run.denied)} pastas.")
+
+def run_cleanup(should_yield=None, on_removed=None):
     """
     Função principal da limpeza. Em "OUTPUT_DIR e ZM_CACHE_DIR"
     apaga arquivos/pastas mais antigos que o limite definido.
+    Retorna o resumo da execução (bytes/inodes liberados, orçamento esgotado).
     """
 
     RETENTION_DAYS = CLEANUP_RETENTION_DAYS
 
     # O timestamp limite (para comparação de arquivos individuais e pastas de evento)
     DELETE_TIME_SECONDS = time.time() - (RETENTION_DAYS * 86400)
-    
+
     # Data limite (para comparar nomes de pasta de data: DD-MM-YYYY ou YYYY-MM-DD)
     DELETE_DATE = datetime.now() - timedelta(days=RETENTION_DAYS)
 
     logging.info(f"Iniciando rotina de limpeza. Apagando dados mais antigos do que {RETENTION_DAYS} dias ({DELETE_DATE.strftime('%d-%m-%Y %H:%M:%S')}).")
 
-    base_dir = OUTPUT_DIR
+    run = CleanupRun(should_yield=should_yield, on_removed=on_removed)
+    tasks = []
+    _collect_output(OUTPUT_DIR, DELETE_DATE, DELETE_TIME_SECONDS, tasks)
 
-    # --- 1. Limpeza do OUTPUT_DIR (Logs e Imagens organizados por DATA) ---
-    logging.info("--> 1/3: limpando logs e imagens em OUTPUT_DIR (pastas de data).")
-
-    if os.path.exists(base_dir):
-        # Visualiza as pastas diárias (DD-MM-YYYY)
-        for daily_folder_name in os.listdir(base_dir):
-            daily_path = os.path.join(base_dir, daily_folder_name)
-            
-            # Ignora arquivos de controle e pastas que não são de data
-            if not os.path.isdir(daily_path) or daily_folder_name in ('Stats', 'processed_events.txt'):
-                 continue
-
-            # Tenta deletar a pasta de data completa se ela for mais antiga que o limite
-            try:
-                folder_date = datetime.strptime(daily_folder_name, "%d-%m-%Y")
-                if folder_date.date() < DELETE_DATE.date():
-                    logging.warning(f"🧹 Deletando pasta de log diário completa: {daily_path}")
-                    os.system(f"rm -rf \"{daily_path}\"")
-                    continue # Se deletou a pasta, vai para a próxima
-            except ValueError:
-                pass # Não é uma pasta de data (ex: 'Stats'), ignora e segue
-
-            # Se a pasta de data existe e é recente (não foi deletada), varre pastas ID_CAMERA DENTRO dela
-            for cam_folder_name in os.listdir(daily_path):
-                if not cam_folder_name.startswith('ID_'):
-                    continue
-
-                cam_path = os.path.join(daily_path, cam_folder_name)
-
-                # Deleta arquivos de log JSON antigos DENTRO das pastas ID_camera
-                for file_name in os.listdir(cam_path):
-                    file_path = os.path.join(cam_path, file_name)
-                    
-                    if os.path.isfile(file_path):
-                        file_mtime = os.path.getmtime(file_path)
-                        if file_mtime < DELETE_TIME_SECONDS:
-                            try:
-                                logging.warning(f"🧹 Deletando arquivo de log JSON: {file_path}")
-                                os.remove(file_path) # os.remove lida bem com espaços nativamente
-                            except Exception:
-                                logging.exception(f"Falha ao deletar arquivo {file_path}.")
-
-
-    # --- 2. Limpeza do OUTPUT_DIR: Imagens DeepStack Legado (Estrutura: ID_CAMERA/EVENTO_ID) ---
-    # Mantido para limpar estruturas antigas ou casos onde a pasta não está dentro da data
-    logging.info("--> 2/3: Limpando pastas de evento (imagens DeepStack) soltas em OUTPUT_DIR.")
-    
-    if os.path.exists(base_dir):
-        # Percorre pastas ID_CAMERA na raiz do OUTPUT_DIR
-        for cam_folder_name in os.listdir(base_dir):
-            # Ignora pastas de data (DD-MM-YYYY) ou arquivos soltos
-            if not cam_folder_name.startswith('ID_') or not os.path.isdir(os.path.join(base_dir, cam_folder_name)):
-                continue
-                
-            cam_path = os.path.join(base_dir, cam_folder_name)
-            
-            # Percorre as pastas de evento (EVENTO_ID, que contêm as imagens)
-            for event_folder_name in os.listdir(cam_path):
-                event_path = os.path.join(cam_path, event_folder_name)
-                
-                # Deletamos o diretório completo se a data de modificação for antiga
-                if os.path.isdir(event_path):
-                    folder_mtime = os.path.getmtime(event_path)
-                    
-                    if folder_mtime < DELETE_TIME_SECONDS:
-                        try:
-                            logging.warning(f"🧹 Deletando pasta de evento (imagens DeepStack): {event_path}")
-                            os.system(f"rm -rf \"{event_path}\"") 
-                        except Exception:
-                            logging.exception(f"Falha ao deletar pasta de evento {event_path}.")
-
-
-    # --- 3. Limpeza do Cache do ZoneMinder (ZM_CACHE_DIR/events) ---
-    logging.info("--> 3/3: Limpando o cache de eventos do ZoneMinder (Imagens originais).")
     zm_events_base = os.path.join(ZM_CACHE_DIR, "events")
-
-    if not os.path.isdir(zm_events_base):
+    if os.path.isdir(zm_events_base):
+        _collect_zm_cache(zm_events_base, DELETE_DATE, tasks)
+    else:
         logging.warning(f"Pasta base de eventos do ZM não encontrada: {zm_events_base}")
-        logging.info("Rotina de limpeza concluída.")
-        return
 
-    # Percorre pastas ID_CAMERA (ex: /mnt/zm_store/events/3)
-    for cam_id_folder in os.listdir(zm_events_base):
-        cam_path = os.path.join(zm_events_base, cam_id_folder)
+    # Poucas threads: o gargalo é o disco, e a limpeza não deve disputar com a inferência
+    with ThreadPoolExecutor(max_workers=CLEANUP_WORKERS, thread_name_prefix="cleanup") as pool:
+        for kind, target, description in tasks:
+            if kind == "tree":
+                pool.submit(_delete_tree, target, run, description)
+            else:
+                pool.submit(_delete_file, target, run)
+    run.finish()
 
-        if not os.path.isdir(cam_path) or not cam_id_folder.isdigit():
-            continue
+    elapsed = time.monotonic() - run.started
+    summary = {
+        "bytes_liberados":  run.bytes,
+        "inodes_liberados": run.inodes,
+        "pastas_removidas": run.trees,
+        "segundos":         round(elapsed, 1),
+        "orcamento_esgotado": bool(run.exhausted),
+    }
+    logging.info(f"Rotina de limpeza concluída: {run.bytes / 1024 / 1024:.1f} MB e {run.inodes} inodes liberados "
+                 f"em {elapsed:.1f}s" + (" (orçamento esgotado, o restante fica para a próxima rodada)." if run.exhausted else "."))
+    return summary
 
-        # Percorre pastas de DATA (YYYY-MM-DD)
-        for date_folder_name in os.listdir(cam_path):
-            date_path = os.path.join(cam_path, date_folder_name)
-            
-            # Valida o formato YYYY-MM-DD (usado pelo ZM)
+def start_cleaner(should_yield=None, on_removed=None, interval_minutes=CLEANUP_INTERVAL_MINUTES):
+    """Roda a limpeza em thread própria, fora do loop do watcher."""
+    def loop():
+        while True:
+            time.sleep(interval_minutes * 60)
             try:
-                folder_date = datetime.strptime(date_folder_name, "%Y-%m-%d")
-            except ValueError:
-                continue
-
-            if folder_date.date() < DELETE_DATE.date():
-                try: 
-                    # Apaga a pasta inteira da data (com todos os eventos daquele dia)
-                    logging.warning(f"🧹 ZM Cache: Deletando pasta de data antiga {date_folder_name} (Câmera {cam_id_folder}).")
-                    os.system(f"sudo rm -rf \"{date_path}\"") 
-                except Exception:
-                    logging.exception(f"ZM Cache: Falha ao deletar pasta {date_path}.")
+                run_cleanup(should_yield, on_removed)
+            except Exception:
+                logging.exception("Erro na limpeza.")
 
-    logging.info("Rotina de limpeza concluída.")
+    thread = threading.Thread(target=loop, daemon=True, name="cleaner")
+    thread.start()
+    return thread
 
 if __name__ == "__main__":
-    # Garante que o handler de erro JSON esteja ativo
-    logger = logging.getLogger()
-    if not any(isinstance(h, JSONErrorHandler) for h in logger.handlers):
-         logger.addHandler(JSONErrorHandler())
-        
+    # Garante que o handler de erro JSON esteja ativo (fica no listener da fila de log, não no root)
+    if not any(isinstance(h, JSONErrorHandler) for h in LOG_LISTENER.handlers):
+         logging.getLogger().addHandler(JSONErrorHandler())
+
     try:
         run_cleanup()
     except Exception:
-        logging.exception("Erro fatal na execução da rotina de limpeza.")
\ No newline at end of file
+        logging.exception("Erro fatal na execução da rotina de limpeza.")
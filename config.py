@@ -1,7 +1,12 @@
 import os
+import re
+import copy
 import time
-import logging
 import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
 import urllib3
 from urllib3.exceptions import InsecureRequestWarning
 
@@ -13,52 +18,251 @@ ZMPASS          = "sunshield1414"
 ZM_ADDR         = "192.168.1.39"
 DEEPSTACK_ADDR  = "localhost:5001"
 
+# Banco do ZoneMinder
+DB_POOL_SIZE          = 6  # deve cobrir STAGE_CONCURRENCY["db"] + threads de background
+DB_POOL_TIMEOUT       = 10 # segundos esperando conexao livre no pool antes de desistir
+DB_CACHE_TTL          = 30 # segundos de validade do cache de monitores/grupos
+DB_CACHE_MIN_REFRESH  = 5  # intervalo minimo entre recargas forcadas
+# Backends DeepStack (containers/nós). A carga é distribuída entre eles.
+DEEPSTACK_ADDRS = [DEEPSTACK_ADDR]
+
+# Cliente HTTP do DeepStack
+DEEPSTACK_CONNECT_TIMEOUT = 2    # segundos
+DEEPSTACK_READ_TIMEOUT    = 15   # segundos
+DEEPSTACK_RETRIES         = 3
+DEEPSTACK_BACKOFF_BASE    = 0.25 # segundos, dobra a cada tentativa (com jitter)
+DEEPSTACK_BACKOFF_MAX     = 2.0
+BREAKER_FAILURE_THRESHOLD = 5    # falhas seguidas para abrir o circuito
+BREAKER_RESET_SECONDS     = 30   # tempo com o circuito aberto antes de testar de novo
+DEEPSTACK_HEALTH_INTERVAL = 10   # segundos entre health checks (só com mais de um backend)
+DEEPSTACK_LATENCY_ALPHA   = 0.2  # peso da última medição na latência média
+
 # Diretorios no novo volume
 OUTPUT_DIR      = "/media/srv-sunshield/NovoVolume/Script_imagens"
 ZM_CACHE_DIR    = "/media/srv-sunshield/NovoVolume/Events_ZM" 
 ZM_LOGS_DIR     = "/media/srv-sunshield/NovoVolume/Logs_ZM"   
 
 PROCESSED_FILE  = os.path.join(OUTPUT_DIR, "processed_events.txt")
+PROCESSED_RETENTION_HOURS   = 48   # eventos processados lembrados por esse tempo
+PROCESSED_COMPACT_MIN_LINES = 1000 # linhas obsoletas toleradas antes de compactar o journal
 IA_MONITORING_FILE = "/var/www/html/ia_monitoring_cameras.json"
 
 CLEANUP_RETENTION_DAYS   = 1
 CLEANUP_INTERVAL_MINUTES = 60
+CLEANUP_WORKERS          = 3      # threads apagando em paralelo
+CLEANUP_MAX_SECONDS      = 300    # orcamento de tempo por rodada; o resto fica para a proxima
+CLEANUP_MAX_INODES       = 200000 # orcamento de IO por rodada (arquivos + pastas apagados, 0 = sem limite)
+CLEANUP_YIELD_SECONDS    = 5      # pausa enquanto a fila de eventos esta cheia
+
+# Retencao por espaco: alem da idade, remove os dias mais antigos por cota/disco cheio
+RETENTION_INDEX_FILE       = os.path.join(OUTPUT_DIR, "Stats", "usage_index.sqlite3") # bytes por camera/dia
+RETENTION_HIGH_WATERMARK   = 0.90 # uso do volume que dispara a remocao
+RETENTION_LOW_WATERMARK    = 0.80 # remove ate voltar a esse uso
+RETENTION_CAMERA_QUOTAS_GB = {}   # ex.: {3: 200} limita a camera 3 a 200 GB (ZM + recortes)
+RETENTION_CHECK_SECONDS    = 60
+RETENTION_RESCAN_HOURS     = 24   # varredura completa para reconciliar o indice
 MAX_EVENT_AGE_MINUTES    = 5 # Ignora eventos com mais de 5 minutos para garantir tempo real
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%d-%m-%Y %H:%M:%S",
-    handlers=[
-        logging.FileHandler(os.path.join(ZM_LOGS_DIR, "sentinel_ia.log")),
-        logging.StreamHandler()
-    ]
-)
+# Estatisticas: contadores em memoria gravados em lote
+STATS_FLUSH_SECONDS = 30
+ROLLUP_DB           = os.path.join(OUTPUT_DIR, "Stats", "rollups.sqlite3") # hora -> dia -> mes -> ano
+
+# Rastreamento de objetos no evento: um recorte por objeto distinto
+TRACK_IOU_THRESHOLD  = 0.3          # sobreposicao minima para ser o mesmo objeto
+TRACK_CENTROID_RATIO = 0.5          # ou centros a menos de 50% da diagonal da caixa
+TRACK_MAX_GAP_FRAMES = 60           # frames sem ver o objeto antes de abrir outro rastro
+TRACK_BEST_BY        = "confidence" # "confidence" ou "area" para escolher o recorte salvo
+
+# Digitos do nome dos frames do ZM (opcao EVENT_IMAGE_DIGITS do ZoneMinder)
+ZM_EVENT_IMAGE_DIGITS = 5
+
+# Amostragem de frames: analisa 1 a cada FRAME_STRIDE frames do evento
+FRAME_STRIDE           = 7
+MIN_DETECTION_FRAMES   = 3    # frames com deteccao necessarios para aceitar o evento
+ADAPTIVE_SAMPLING      = True # comeca com passo grosso e refina so perto das deteccoes
+SAMPLING_COARSE_FACTOR = 3    # passo grosso = FRAME_STRIDE * fator
+
+# Modo streaming: analisa os frames enquanto o ZM ainda grava o evento. Cada evento em
+# streaming prende um worker até fechar (ou STREAM_MAX_SECONDS); no máximo
+# STAGE_CONCURRENCY["stream"] ao mesmo tempo, o excedente vai pelo modo em lote
+STREAMING_MODE           = False
+STREAM_POLL_INTERVAL     = 0.25 # segundos entre verificacoes da pasta do evento
+STREAM_DB_CHECK_INTERVAL = 1.0  # intervalo minimo entre consultas de EndDateTime
+STREAM_IDLE_TIMEOUT      = 10   # encerra se nenhum frame novo aparecer nesse tempo (s)
+STREAM_MAX_SECONDS       = 120  # limite para nao prender um worker em eventos muito longos
+
+# Detector: "deepstack" (servico HTTP) ou "onnx" (modelo YOLO em CPU no proprio processo)
+DETECTOR_BACKEND         = "deepstack"
+DETECTION_MIN_CONFIDENCE = 0.65
+DETECTOR_BATCH_SIZE      = 4     # frames por chamada quando o detector aceita lotes
+ONNX_MODEL_PATH          = "/opt/lockdown/models/yolov8n.onnx"
+ONNX_INPUT_SIZE          = 640
+ONNX_THREADS             = 4
+ONNX_IOU_THRESHOLD       = 0.45
+# Cache de resultados por hash do frame (0 desativa); INFERENCE_CACHE_DIR = None so memoria
+INFERENCE_CACHE_SIZE     = 5000
+INFERENCE_CACHE_DIR      = None  # ex: os.path.join(OUTPUT_DIR, "inference_cache")
+# Mosaico: junta varios frames do evento em uma so requisicao ao DeepStack
+DEEPSTACK_MOSAIC         = False
+DEEPSTACK_MOSAIC_GRID    = (2, 2) # colunas, linhas
+DEEPSTACK_MOSAIC_TILE    = 416    # lado de cada ladrilho (px)
+
+# Preparacao do frame antes de enviar para a IA
+DETECTOR_INPUT_SIZE = 640 # maior lado da imagem enviada (0 = resolucao original)
+UPLOAD_JPEG_QUALITY = 85
+
+# Pre-filtro de similaridade: frames quase iguais ao ultimo analisado nao vao para a IA
+SIMILARITY_THRESHOLD  = 2.5 # diferenca media de cinza (0-255); 0 desativa
+SIMILARITY_THRESHOLDS = {}  # limiar por camera, ex: {11: 4.0, 12: 0}
+SIMILARITY_THUMB_SIZE = 32
+
+# Gravacao de recortes/frames em background
+ARTIFACT_OWNER       = "www-data:www-data" # None = depende so do grupo/umask das pastas
+ARTIFACT_CHOWN_BATCH = 50                  # arquivos por chamada de chown
+
+# Descoberta de eventos: "filesystem" (watchdog no ZM_CACHE_DIR) ou "database" (tabela Events)
+EVENT_DISCOVERY        = "filesystem"
+DISCOVERY_POLL_SECONDS = 1.0
+DISCOVERY_BATCH        = 200
+CATCHUP_WORKERS        = 8 # threads listando pastas no catch-up da inicializacao
+
+# Pipeline de processamento (fila limitada + pool de workers)
+WORKER_COUNT      = 4
+EVENT_QUEUE_SIZE  = 200
+# Fila justa por camera: peso de cada camera no round-robin (padrao 1)
+CAMERA_PRIORITIES = {}  # ex: {11: 3, 12: 2}
+CAMERA_QUEUE_SIZE = 30  # maximo de eventos pendentes por camera
+# Descarte de carga: com a fila acima do limite, aumenta o passo de amostragem
+SHED_BACKLOG_THRESHOLD = 40
+SHED_STRIDE_FACTOR     = 2
+# Máximo de threads simultâneas em cada estágio do processamento
+STAGE_CONCURRENCY = {
+    "db":        2,
+    "deepstack": 4,
+    "stream":    2,  # eventos em streaming; deve ficar abaixo de WORKER_COUNT
+}
+
+# Log de erros: JSONL por dia, repetidos agregados e limite por minuto
+ERROR_LOG_DEDUP_SECONDS = 60 # mesma mensagem (mesma camera) vira contador dentro dessa janela
+ERROR_LOG_RATE_LIMIT    = 30 # linhas de erro por minuto; o excesso so e contado
 
 class JSONErrorHandler(logging.Handler):
+    """
+    Grava os erros em OUTPUT_DIR/<dia>/error_log.jsonl (uma linha por erro, arquivo
+    aberto em append). Mensagens repetidas dentro de ERROR_LOG_DEDUP_SECONDS são só
+    contadas e saem como `repeticoes` na próxima ocorrência registrada; acima de
+    ERROR_LOG_RATE_LIMIT linhas por minuto o resto é descartado e contado em
+    `suprimidas`. Roda na thread do QueueListener, nunca na de quem logou.
+    """
+
+    def __init__(self, output_dir=OUTPUT_DIR, dedup_seconds=ERROR_LOG_DEDUP_SECONDS, rate_limit=ERROR_LOG_RATE_LIMIT):
+        super().__init__(level=logging.ERROR)
+        self.output_dir    = output_dir
+        self.dedup_seconds = dedup_seconds
+        self.rate_limit    = rate_limit
+        self.repeats       = {}  # (camera, mensagem normalizada) -> [última gravação, repetições]
+        self.window        = 0   # minuto corrente do limite
+        self.written       = 0
+        self.suppressed    = 0
+        self.stream        = None
+        self.stream_date   = None
+
+    @staticmethod
+    def _key(record):
+        # Números (ids, tentativas, tempos) não diferenciam a mensagem
+        return getattr(record, "camera_id", "general"), re.sub(r"\d+", "#", record.getMessage())
+
     def emit(self, record):
-        if record.levelno < logging.ERROR:
-            return
+        try:
+            now = record.created
+            key = self._key(record)
+
+            entry = self.repeats.get(key)
+            if entry and now - entry[0] < self.dedup_seconds:
+                entry[1] += 1
+                return
+
+            minute = int(now // 60)
+            if minute != self.window:
+                self.window, self.written = minute, 0
+                # Descarta contadores expirados para o dicionário não crescer em uma pane longa
+                self.repeats = {k: v for k, v in self.repeats.items() if now - v[0] < self.dedup_seconds or v[1]}
+            if self.written >= self.rate_limit:
+                self.suppressed += 1
+                return
+
+            date_str = time.strftime("%d-%m-%Y", time.localtime(now))
+            error_data = {
+                "data_execucao": f"{date_str} {time.strftime('%H:%M:%S', time.localtime(now))}",
+                "nivel": record.levelname,
+                "camera": key[0],
+                "mensagem": record.getMessage(),
+                "traceback": record.exc_text or "",
+                "repeticoes": entry[1] if entry else 0,
+                "suprimidas": self.suppressed,
+            }
+            self.repeats[key] = [now, 0]
+            self.suppressed = 0
+            self.written += 1
+            self._write(date_str, error_data)
+        except Exception:
+            self.handleError(record)
+
+    def _write(self, date_str, data):
+        if self.stream_date != date_str:
+            if self.stream:
+                self.stream.close()
+            daily_folder = os.path.join(self.output_dir, date_str)
+            os.makedirs(daily_folder, exist_ok=True)
+            self.stream = open(os.path.join(daily_folder, "error_log.jsonl"), "a", encoding="utf-8")
+            self.stream_date = date_str
+        self.stream.write(json.dumps(data, ensure_ascii=False) + "\n")
+        self.stream.flush()
 
-        date_str = time.strftime("%d-%m-%Y")
-        time_str = time.strftime("%H:%M:%S")
+    def close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        super().close()
 
-        daily_folder = os.path.join(OUTPUT_DIR, date_str)
-        os.makedirs(daily_folder, exist_ok=True)
+class _QueueHandler(QueueHandler):
+    """Como o QueueHandler, mas mantém mensagem e traceback separados (o JSONErrorHandler usa os dois)."""
 
-        cam = getattr(record, "camera_id", "general")
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _formatter.formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
 
-        error_data = {
-            "data_execucao": f"{date_str} {time_str}",
-            "nivel": record.levelname,
-            "mensagem": record.getMessage(),
-            "traceback": record.exc_text or ""
-        }
+# Todos os handlers ficam atrás de uma fila: quem loga só enfileira, a escrita
+# em arquivo/console/JSONL acontece na thread do listener
+_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%d-%m-%Y %H:%M:%S")
 
-        path = os.path.join(daily_folder, f"error_log_ID_{cam}_{time_str}.json")
+def _start_log_listener():
+    file_handler = logging.FileHandler(os.path.join(ZM_LOGS_DIR, "sentinel_ia.log"))
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(_formatter)
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, stream_handler, JSONErrorHandler(), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return log_queue, listener
 
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(error_data, f, indent=4)
+def reset_logging_in_child():
+    """
+    Initializer para processos filhos (fork): a thread do listener não existe no filho,
+    então a fila herdada nunca seria drenada e todo log do worker se perderia.
+    Cria fila e listener próprios do processo.
+    """
+    global LOG_LISTENER
+    log_queue, LOG_LISTENER = _start_log_listener()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
 
-logger = logging.getLogger()
-logger.addHandler(JSONErrorHandler())
\ No newline at end of file
+_log_queue, LOG_LISTENER = _start_log_listener()
+logging.basicConfig(level=logging.INFO, handlers=[_QueueHandler(_log_queue)])
@@ -1,100 +1,187 @@
 import mysql.connector
+from mysql.connector import pooling
 import time
 import logging
-from config import ZMUSER, ZMPASS
+import threading
+from contextlib import contextmanager
+from config import ZMUSER, ZMPASS, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_CACHE_TTL, DB_CACHE_MIN_REFRESH
 
-def get_db_connection(retries=3, delay=2):
-    attempt = 0
-    while attempt < retries:
-        try:
-            return mysql.connector.connect(
+_pool      = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="lockdown",
+                pool_size=DB_POOL_SIZE,
+                pool_reset_session=True,
                 host="localhost",
                 user=ZMUSER,
                 password=ZMPASS,
                 database="zm"
             )
+        return _pool
+
+def get_db_connection(retries=3, delay=2, pool_timeout=DB_POOL_TIMEOUT):
+    """Conexão do pool (close() devolve ao pool). Reconecta se o MySQL derrubou a conexão ociosa."""
+    attempt = 0
+    deadline = time.monotonic() + pool_timeout
+    while attempt < retries:
+        conn = None
+        try:
+            conn = _get_pool().get_connection()
+            conn.ping(reconnect=True, attempts=2, delay=0)
+            return conn
+        except pooling.PoolError:
+            # Pool esgotado: espera uma conexão voltar, sem contar como falha do banco, até o limite
+            if time.monotonic() >= deadline:
+                raise Exception(f"Pool do MySQL esgotado há mais de {pool_timeout}s ({DB_POOL_SIZE} conexões em uso).")
+            time.sleep(0.05)
         except mysql.connector.Error as e:
+            # Devolve a conexão ao pool, senão a vaga fica presa para sempre
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
             attempt += 1
             logging.error(f"Tentativa {attempt}/{retries} falhou: {e}")
             time.sleep(delay)
     raise Exception("Não conectou ao MySQL após várias tentativas.")
 
+@contextmanager
+def db_cursor(dictionary=False):
+    conn   = get_db_connection()
+    cursor = conn.cursor(dictionary=dictionary)
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+        conn.close()
+
 def get_latest_event(zmmoid):
     """Retorna (Id, StartDateTime) do último evento."""
-    conn = None
     try:
-        conn   = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT Id, StartDateTime
-            FROM Events
-            WHERE MonitorId = %s
-            ORDER BY StartDateTime DESC
-            LIMIT 1
-        """, (zmmoid,))
-        row = cursor.fetchone()
-        cursor.close()
+        with db_cursor(dictionary=True) as cursor:
+            cursor.execute("""
+                SELECT Id, StartDateTime
+                FROM Events
+                WHERE MonitorId = %s
+                ORDER BY StartDateTime DESC
+                LIMIT 1
+            """, (zmmoid,))
+            row = cursor.fetchone()
         return (row['Id'], row['StartDateTime']) if row else (None, None)
     except Exception:
         logging.exception(f"get_latest_event: falha ao buscar evento para monitor {zmmoid}")
         return (None, None)
-    finally:
-        if conn:
-            conn.close()
 
 def get_event_data(event_id):
     """Retorna o StartDateTime real do evento para validacao de tempo real."""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT StartDateTime FROM Events WHERE Id = %s", (event_id,))
-        row = cursor.fetchone()
-        cursor.close()
+        with db_cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT StartDateTime FROM Events WHERE Id = %s", (event_id,))
+            row = cursor.fetchone()
         return row['StartDateTime'] if row else None
     except Exception:
         logging.exception(f"Erro ao buscar data do evento {event_id}")
         return None
-    finally:
-        if conn: conn.close()
 
-def get_camera_groups(camera_id):
-    """Retorna uma lista de IDs de todos os grupos da camera."""
-    conn = None
+def get_event_end(event_id):
+    """Retorna o EndDateTime do evento (None enquanto o ZM ainda grava)."""
     try:
-        conn   = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT g.Id
-              FROM Groups AS g
-              JOIN Groups_Monitors AS gm ON gm.groupId = g.Id
-             WHERE gm.monitorId = %s
-        """, (camera_id,))
-        groups = [row[0] for row in cursor.fetchall()]
-        cursor.close()
-        return groups
+        with db_cursor(dictionary=True) as cursor:
+            cursor.execute("SELECT EndDateTime FROM Events WHERE Id = %s", (event_id,))
+            row = cursor.fetchone()
+        return row['EndDateTime'] if row else None
     except Exception:
-        logging.exception(f"get_camera_groups: falha para câmera {camera_id}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+        logging.exception(f"Erro ao buscar fim do evento {event_id}")
+        return None
+
+class MonitorCache:
+    """
+    Cache com TTL da lista de monitores ativos e do mapa monitor -> grupos.
+    Carregado em lote (duas consultas) e atualizado em background; se a
+    atualização falhar, mantém os últimos valores bons.
+    """
+
+    def __init__(self, ttl=DB_CACHE_TTL):
+        self.ttl        = ttl
+        self.monitors   = []
+        self.groups     = {}
+        self.loaded_at  = 0.0
+        self._attempted = 0.0
+        self._lock      = threading.Lock()
+        self._thread    = None
+
+    def refresh(self, min_age=0):
+        with self._lock:
+            # Conta tentativas com falha também, para não martelar um MySQL fora do ar
+            if time.monotonic() - self._attempted < min_age:
+                return
+            self._attempted = time.monotonic()
+            # Consultas independentes: uma falha nos grupos não pode descartar a lista de monitores
+            try:
+                with db_cursor() as cursor:
+                    cursor.execute("SELECT Id FROM Monitors WHERE Function != 'None' ORDER BY Id ASC")
+                    monitors = [row[0] for row in cursor.fetchall()]
+            except Exception:
+                logging.exception("MonitorCache: falha ao atualizar monitores do DB.")
+                return
+
+            if monitors != self.monitors:
+                logging.info(f"Câmeras ativas carregadas do DB: {monitors}")
+            self.monitors  = monitors
+            self.loaded_at = time.monotonic()
+
+            try:
+                with db_cursor() as cursor:
+                    # `Groups` é palavra reservada no MySQL >= 8.0.2
+                    cursor.execute("""
+                        SELECT gm.MonitorId, g.Id
+                          FROM `Groups` AS g
+                          JOIN Groups_Monitors AS gm ON gm.GroupId = g.Id
+                    """)
+                    groups = {}
+                    for monitor_id, group_id in cursor.fetchall():
+                        groups.setdefault(monitor_id, []).append(group_id)
+            except Exception:
+                logging.exception("MonitorCache: falha ao atualizar grupos do DB (mantendo os últimos).")
+                return
+            self.groups = groups
+
+    def _ensure_fresh(self):
+        if time.monotonic() - self.loaded_at >= self.ttl:
+            self.refresh(min_age=self.ttl)
+
+    def get_monitors(self):
+        self._ensure_fresh()
+        return list(self.monitors)
+
+    def get_groups(self, camera_id):
+        self._ensure_fresh()
+        return list(self.groups.get(int(camera_id), []))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-cache", daemon=True)
+            self._thread.start()
 
-def get_active_monitor_ids():
+    def _run(self):
+        while True:
+            self.refresh(min_age=self.ttl / 2)
+            time.sleep(self.ttl / 2)
+
+monitor_cache = MonitorCache()
+
+def get_camera_groups(camera_id):
+    """Retorna uma lista de IDs de todos os grupos da camera (do cache)."""
+    return monitor_cache.get_groups(camera_id)
+
+def get_active_monitor_ids(refresh=False):
     """Retorna IDs das câmeras ATIVAS filtrando quem foi deletado (Function != 'None')."""
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT Id FROM Monitors WHERE Function != 'None' ORDER BY Id ASC")
-        monitors = [row[0] for row in cursor.fetchall()]
-        cursor.close()
-        conn.close()
-        logging.info(f"Câmeras ativas carregadas do DB: {monitors}")
-        return monitors
-    except Exception:
-        logging.exception("get_active_monitor_ids: falha ao buscar monitores ativos do DB.")
-        return []
-    finally:
-        if conn:
-            pass
\ No newline at end of file
+    if refresh:
+        monitor_cache.refresh(min_age=DB_CACHE_MIN_REFRESH)
+    return monitor_cache.get_monitors()
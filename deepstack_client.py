@@ -0,0 +1,190 @@
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    DEEPSTACK_ADDRS, WORKER_COUNT, DEEPSTACK_CONNECT_TIMEOUT, DEEPSTACK_READ_TIMEOUT,
+    DEEPSTACK_RETRIES, DEEPSTACK_BACKOFF_BASE, DEEPSTACK_BACKOFF_MAX,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS,
+    DEEPSTACK_HEALTH_INTERVAL, DEEPSTACK_LATENCY_ALPHA,
+)
+
+class CircuitBreaker:
+    """
+    Abre após `threshold` falhas seguidas e rejeita chamadas por `reset_seconds`.
+    Depois disso deixa passar uma chamada de teste (meio-aberto): sucesso fecha, falha reabre.
+    """
+
+    def __init__(self, name="DeepStack", threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name          = name
+        self.threshold     = threshold
+        self.reset_seconds = reset_seconds
+        self.failures      = 0
+        self.opened_at     = None
+        self._probing      = False
+        self._lock         = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "fechado"
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                return "meio-aberto"
+            return "aberto"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logging.info(f"🔌 {self.name} respondeu novamente, circuito fechado.")
+            self.failures  = 0
+            self.opened_at = None
+            self._probing  = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                logging.error(f"🔌 {self.name} indisponível ({self.failures} falhas seguidas). Circuito aberto por {self.reset_seconds}s.")
+            self._probing = False
+
+class Backend:
+    """Um container/nó DeepStack: requisições em andamento, latência média (EWMA) e saúde."""
+
+    def __init__(self, addr):
+        self.addr     = addr
+        self.inflight = 0
+        self.latency  = None
+        self.healthy  = True
+        self.breaker  = CircuitBreaker(name=f"DeepStack {addr}")
+
+    @property
+    def available(self):
+        return self.healthy and self.breaker.state != "aberto"
+
+    def record_latency(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = DEEPSTACK_LATENCY_ALPHA * seconds + (1 - DEEPSTACK_LATENCY_ALPHA) * self.latency
+
+class DeepStackClient:
+    """
+    Cliente HTTP compartilhado para um ou mais backends DeepStack: pool de conexões
+    keep-alive, timeouts, backoff com jitter e circuit breaker por backend. Cada
+    requisição vai para o backend disponível com menos requisições em andamento
+    (empate: menor latência recente). Um health check em background ejeta e
+    readmite backends.
+    """
+
+    def __init__(self, addrs=DEEPSTACK_ADDRS, pool_size=WORKER_COUNT):
+        self.backends = [Backend(addr) for addr in addrs]
+        self.timeout  = (DEEPSTACK_CONNECT_TIMEOUT, DEEPSTACK_READ_TIMEOUT)
+        self.session  = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.backends), pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock    = threading.Lock()
+        self._health  = None
+
+    def start_health_checks(self, interval=DEEPSTACK_HEALTH_INTERVAL):
+        if self._health is None:
+            self._health = threading.Thread(target=self._health_loop, args=(interval,), name="deepstack-health", daemon=True)
+            self._health.start()
+
+    def snapshot(self):
+        return [
+            {"addr": b.addr, "saudavel": b.healthy, "circuito": b.breaker.state, "em_andamento": b.inflight,
+             "latencia_ms": round(b.latency * 1000) if b.latency is not None else None}
+            for b in self.backends
+        ]
+
+    def _acquire(self, exclude):
+        """Escolhe o backend e já reserva uma vaga nele."""
+        with self._lock:
+            candidates = [b for b in self.backends if b.available and b not in exclude]
+            if not candidates:
+                # Todos já tentados nesta requisição: volta a considerar qualquer um disponível
+                candidates = [b for b in self.backends if b.available]
+            candidates.sort(key=lambda b: (b.inflight, b.latency if b.latency is not None else 0.0))
+            for backend in candidates:
+                if backend.breaker.allow():
+                    backend.inflight += 1
+                    return backend
+        return None
+
+    def _release(self, backend):
+        with self._lock:
+            backend.inflight -= 1
+
+    def detect(self, image_data, min_confidence, retries=DEEPSTACK_RETRIES):
+        """Envia a imagem para /v1/vision/detection. Retorna o JSON ou None se falhar/sem backend disponível."""
+        tried = []
+        for attempt in range(1, retries + 1):
+            backend = self._acquire(tried)
+            if backend is None:
+                return None
+            tried.append(backend)
+            started = time.monotonic()
+            try:
+                response = self.session.post(
+                    f"http://{backend.addr}/v1/vision/detection",
+                    files={"image": image_data},
+                    data={"min_confidence": min_confidence},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                result = response.json()
+                backend.record_latency(time.monotonic() - started)
+                backend.breaker.success()
+                return result
+            except (requests.RequestException, ValueError) as e:
+                backend.breaker.failure()
+                logging.error(f"Tentativa {attempt}/{retries} falhou no DeepStack ({backend.addr}): {e}")
+                if attempt < retries:
+                    # Backoff exponencial com "full jitter"
+                    time.sleep(random.uniform(0, min(DEEPSTACK_BACKOFF_MAX, DEEPSTACK_BACKOFF_BASE * 2 ** (attempt - 1))))
+            finally:
+                self._release(backend)
+        return None
+
+    def _health_loop(self, interval):
+        while True:
+            for backend in self.backends:
+                try:
+                    self.session.get(f"http://{backend.addr}/", timeout=self.timeout).raise_for_status()
+                    ok = True
+                except requests.RequestException:
+                    ok = False
+
+                if ok and not backend.healthy:
+                    logging.info(f"🩺 DeepStack {backend.addr} readmitido.")
+                    backend.breaker.success()
+                elif not ok and backend.healthy:
+                    logging.error(f"🩺 DeepStack {backend.addr} falhou no health check, ejetado.")
+                backend.healthy = ok
+            time.sleep(interval)
+
+_client      = None
+_client_lock = threading.Lock()
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DeepStackClient()
+            if len(_client.backends) > 1:
+                _client.start_health_checks()
+        return _client
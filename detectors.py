@@ -0,0 +1,285 @@
+import io
+import logging
+import threading
+from PIL import Image
+from config import (
+    DETECTOR_BACKEND, DETECTOR_BATCH_SIZE, DETECTION_MIN_CONFIDENCE,
+    DEEPSTACK_MOSAIC, DEEPSTACK_MOSAIC_GRID, DEEPSTACK_MOSAIC_TILE, UPLOAD_JPEG_QUALITY,
+    DETECTOR_INPUT_SIZE, INFERENCE_CACHE_SIZE,
+    ONNX_MODEL_PATH, ONNX_INPUT_SIZE, ONNX_THREADS, ONNX_IOU_THRESHOLD,
+)
+from deepstack_client import get_client
+from inference_cache import InferenceCache
+
+# Classes do COCO, na ordem de saída dos modelos YOLO exportados para ONNX
+COCO_LABELS = [
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat",
+    "traffic light", "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat",
+    "dog", "horse", "sheep", "cow", "elephant", "bear", "zebra", "giraffe", "backpack",
+    "umbrella", "handbag", "tie", "suitcase", "frisbee", "skis", "snowboard", "sports ball",
+    "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket",
+    "bottle", "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple",
+    "sandwich", "orange", "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair",
+    "couch", "potted plant", "bed", "dining table", "toilet", "tv", "laptop", "mouse",
+    "remote", "keyboard", "cell phone", "microwave", "oven", "toaster", "sink",
+    "refrigerator", "book", "clock", "vase", "scissors", "teddy bear", "hair drier",
+    "toothbrush",
+]
+
+class Detector:
+    """
+    Interface dos detectores. `detect` recebe PreparedFrames e devolve, para cada
+    um, a lista de predições no formato do DeepStack (label, confidence, x_min,
+    y_min, x_max, y_max) já em coordenadas da imagem original, ou None se a
+    inferência falhou para aquele frame.
+    """
+
+    name       = "base"
+    batch_size = 1
+
+    @property
+    def cache_params(self):
+        """O que, além dos bytes do frame, muda o resultado (entra na chave do cache)."""
+        return (self.name,)
+
+    def detect(self, frames, min_confidence=DETECTION_MIN_CONFIDENCE):
+        raise NotImplementedError
+
+class CachedDetector(Detector):
+    """Envolve um detector com o InferenceCache: acertos não chegam ao detector (nem à rede)."""
+
+    def __init__(self, inner, cache):
+        self.inner      = inner
+        self.cache      = cache
+        self.name       = inner.name
+        self.batch_size = inner.batch_size
+
+    @property
+    def cache_params(self):
+        return self.inner.cache_params
+
+    def detect(self, frames, min_confidence=DETECTION_MIN_CONFIDENCE):
+        params  = (*self.inner.cache_params, min_confidence)
+        keys    = [self.cache.key(frame.data, params) for frame in frames]
+        results = [self.cache.get(key) for key in keys]
+
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            fresh = self.inner.detect([frames[i] for i in misses], min_confidence)
+            for i, predictions in zip(misses, fresh):
+                results[i] = predictions
+                if predictions is not None:
+                    self.cache.put(keys[i], predictions)
+        return results
+
+class DeepStackDetector(Detector):
+    """
+    Serviço DeepStack via HTTP. Normalmente um frame por requisição; com
+    DEEPSTACK_MOSAIC, até colunas x linhas frames do mesmo evento são reduzidos e
+    montados em um mosaico enviado em uma única requisição. As caixas voltam para
+    o frame de origem pelo centro; caixas que cruzam a borda do ladrilho são
+    descartadas (não pertencem a um frame só).
+    """
+
+    name = "deepstack"
+
+    def __init__(self, mosaic=DEEPSTACK_MOSAIC, grid=DEEPSTACK_MOSAIC_GRID, tile=DEEPSTACK_MOSAIC_TILE):
+        self.client     = get_client()
+        self.mosaic     = mosaic
+        self.cols, self.rows = grid
+        self.tile       = tile
+        self.batch_size = self.cols * self.rows if mosaic else 1
+
+    @property
+    def cache_params(self):
+        return (self.name, DETECTOR_INPUT_SIZE, self.tile if self.mosaic else None)
+
+    def detect(self, frames, min_confidence=DETECTION_MIN_CONFIDENCE):
+        if self.mosaic and len(frames) > 1:
+            results = []
+            for start in range(0, len(frames), self.batch_size):
+                results.extend(self._detect_mosaic(frames[start:start + self.batch_size], min_confidence))
+            return results
+
+        results = []
+        for frame in frames:
+            response = self.client.detect(frame.upload, min_confidence=min_confidence)
+            if response is None:
+                results.append(None)
+            else:
+                results.append(frame.to_full(response.get("predictions", [])))
+        return results
+
+    def _detect_mosaic(self, frames, min_confidence):
+        tile = self.tile
+        cols = min(self.cols, len(frames))
+        rows = (len(frames) + cols - 1) // cols
+        canvas = Image.new("RGB", (cols * tile, rows * tile))
+
+        tiles = []  # (x0, y0, largura, altura, escala) de cada frame no mosaico
+        for n, frame in enumerate(frames):
+            image = frame.scaled_image(tile)
+            x0, y0 = (n % cols) * tile, (n // cols) * tile
+            canvas.paste(image, (x0, y0))
+            tiles.append((x0, y0, image.size[0], image.size[1], image.size[0] / frame.size[0]))
+
+        buf = io.BytesIO()
+        canvas.save(buf, "JPEG", quality=UPLOAD_JPEG_QUALITY)
+        response = self.client.detect(buf.getvalue(), min_confidence=min_confidence)
+        if response is None:
+            return [None] * len(frames)
+
+        results = [[] for _ in frames]
+        for obj in response.get("predictions", []):
+            cx = (obj["x_min"] + obj["x_max"]) / 2
+            cy = (obj["y_min"] + obj["y_max"]) / 2
+            n = int(cy // tile) * cols + int(cx // tile)
+            if n >= len(frames):
+                continue
+            x0, y0, w, h, scale = tiles[n]
+            if obj["x_min"] < x0 or obj["y_min"] < y0 or obj["x_max"] > x0 + w or obj["y_max"] > y0 + h:
+                continue
+
+            width, height = frames[n].size
+            mapped = dict(obj)
+            mapped["x_min"] = max(0, min(width,  int((obj["x_min"] - x0) / scale)))
+            mapped["x_max"] = max(0, min(width,  int((obj["x_max"] - x0) / scale)))
+            mapped["y_min"] = max(0, min(height, int((obj["y_min"] - y0) / scale)))
+            mapped["y_max"] = max(0, min(height, int((obj["y_max"] - y0) / scale)))
+            results[n].append(mapped)
+        return results
+
+class OnnxDetector(Detector):
+    """
+    Modelo YOLO (saída [lote, 4 + classes, caixas], ex.: YOLOv8 exportado) rodando
+    em CPU no próprio processo via ONNX Runtime. Recebe os frames já decodificados
+    em escala reduzida e roda o lote inteiro em um único forward.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path=ONNX_MODEL_PATH, input_size=ONNX_INPUT_SIZE):
+        import numpy as np
+        import onnxruntime as ort
+
+        self.np = np
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_THREADS
+        self.session    = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        model_input     = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_size = input_size
+        # Modelos exportados com lote fixo (ex.: 1) não aceitam mais frames por chamada
+        fixed_batch     = model_input.shape[0]
+        self.batch_size = fixed_batch if isinstance(fixed_batch, int) else DETECTOR_BATCH_SIZE
+        self._lock      = threading.Lock()
+        self.model_path = model_path
+        logging.info(f"🧠 Detector ONNX carregado: {model_path} (entrada {input_size}, lote {self.batch_size}).")
+
+    @property
+    def cache_params(self):
+        return (self.name, self.model_path, self.input_size, ONNX_IOU_THRESHOLD)
+
+    def _letterbox(self, frame):
+        np = self.np
+        image = frame.scaled_image(self.input_size)
+        canvas = np.full((self.input_size, self.input_size, 3), 114, dtype=np.uint8)
+        canvas[:image.size[1], :image.size[0]] = np.asarray(image)
+        # Escala do frame original para a imagem enviada ao modelo
+        return canvas, image.size[0] / frame.size[0]
+
+    def detect(self, frames, min_confidence=DETECTION_MIN_CONFIDENCE):
+        np = self.np
+        if not frames:
+            return []
+        prepared = [self._letterbox(frame) for frame in frames]
+        batch = np.stack([canvas for canvas, _ in prepared]).astype(np.float32) / 255.0
+        batch = batch.transpose(0, 3, 1, 2)
+
+        try:
+            with self._lock:
+                output = self.session.run(None, {self.input_name: batch})[0]
+        except Exception:
+            logging.exception("Falha na inferência ONNX.")
+            return [None] * len(frames)
+
+        return [
+            self._postprocess(output[i], scale, frame.size, min_confidence)
+            for i, ((_, scale), frame) in enumerate(zip(prepared, frames))
+        ]
+
+    def _postprocess(self, output, scale, size, min_confidence):
+        np = self.np
+        preds  = output.T                          # [caixas, 4 + classes]
+        scores = preds[:, 4:]
+        cls    = scores.argmax(axis=1)
+        conf   = scores[np.arange(len(cls)), cls]
+        keep   = conf >= min_confidence
+        if not keep.any():
+            return []
+
+        boxes, cls, conf = preds[keep, :4], cls[keep], conf[keep]
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+        xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+        xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+        xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+        xyxy /= scale
+
+        width, height = size
+        predictions = []
+        for i in self._nms(xyxy, conf, cls):
+            x_min, y_min, x_max, y_max = xyxy[i]
+            label = COCO_LABELS[cls[i]] if cls[i] < len(COCO_LABELS) else str(cls[i])
+            predictions.append({
+                "label":      label,
+                "confidence": float(conf[i]),
+                "x_min":      int(max(0, min(width,  x_min))),
+                "y_min":      int(max(0, min(height, y_min))),
+                "x_max":      int(max(0, min(width,  x_max))),
+                "y_max":      int(max(0, min(height, y_max))),
+            })
+        return predictions
+
+    def _nms(self, boxes, scores, classes, iou_threshold=ONNX_IOU_THRESHOLD):
+        """NMS por classe (desloca as caixas de cada classe para não se sobreporem)."""
+        np = self.np
+        offset = classes[:, None] * (boxes.max() + 1)
+        b = boxes + offset
+        areas = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+        order = scores.argsort()[::-1]
+        keep = []
+        while order.size:
+            i = order[0]
+            keep.append(i)
+            xx1 = np.maximum(b[i, 0], b[order[1:], 0])
+            yy1 = np.maximum(b[i, 1], b[order[1:], 1])
+            xx2 = np.minimum(b[i, 2], b[order[1:], 2])
+            yy2 = np.minimum(b[i, 3], b[order[1:], 3])
+            inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+            iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+            order = order[1:][iou <= iou_threshold]
+        return keep
+
+_BACKENDS = {
+    "deepstack": DeepStackDetector,
+    "onnx":      OnnxDetector,
+}
+
+_detector      = None
+_detector_lock = threading.Lock()
+
+def get_detector():
+    """Detector escolhido em DETECTOR_BACKEND (instância única por processo)."""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = _BACKENDS[DETECTOR_BACKEND]()
+            if INFERENCE_CACHE_SIZE:
+                _detector = CachedDetector(_detector, InferenceCache())
+        return _detector
+
+def cache_stats():
+    """Contadores do cache de inferência (None se desativado ou detector ainda não criado)."""
+    cache = getattr(_detector, "cache", None)
+    return cache.stats() if cache else None
@@ -0,0 +1,77 @@
+import logging
+import threading
+from config import DISCOVERY_POLL_SECONDS, DISCOVERY_BATCH
+from db import db_cursor, get_active_monitor_ids
+
+class EventPoller:
+    """
+    Descoberta de eventos pelo banco, alternativa ao watch recursivo do ZM_CACHE_DIR.
+    Consulta incrementalmente a tabela Events (Id > último visto, só monitores ativos)
+    e entrega cada evento ao mesmo pipeline usado pelo watcher, já com o StartDateTime.
+    """
+
+    def __init__(self, pipeline, interval=DISCOVERY_POLL_SECONDS, batch=DISCOVERY_BATCH):
+        self.pipeline  = pipeline
+        self.interval  = interval
+        self.batch     = batch
+        self.last_seen = None
+        self._stop     = threading.Event()
+        self._thread   = None
+
+    def start(self):
+        self.last_seen = self._max_event_id()
+        self._thread = threading.Thread(target=self._run, name="event-poller", daemon=True)
+        self._thread.start()
+        logging.info(f"✅ Descoberta de eventos pelo banco iniciada (a partir do evento {self.last_seen}).")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _max_event_id(self):
+        while not self._stop.is_set():
+            try:
+                with db_cursor() as cursor:
+                    cursor.execute("SELECT COALESCE(MAX(Id), 0) FROM Events")
+                    return cursor.fetchone()[0]
+            except Exception:
+                logging.exception("EventPoller: falha ao ler o último evento do DB.")
+                self._stop.wait(5)
+        return 0
+
+    def poll_once(self):
+        """Enfileira os eventos novos. Retorna quantos foram encontrados."""
+        monitors = get_active_monitor_ids()
+        if not monitors:
+            return 0
+
+        placeholders = ", ".join(["%s"] * len(monitors))
+        with db_cursor(dictionary=True) as cursor:
+            cursor.execute(f"""
+                SELECT Id, MonitorId, StartDateTime
+                  FROM Events
+                 WHERE Id > %s AND MonitorId IN ({placeholders})
+                 ORDER BY Id ASC
+                 LIMIT %s
+            """, (self.last_seen, *monitors, self.batch))
+            rows = cursor.fetchall()
+
+        for row in rows:
+            start_time = row["StartDateTime"]
+            date_str   = start_time.strftime("%Y-%m-%d")
+            # Bloqueia se a fila estiver cheia: o poller espera em vez de perder eventos
+            self.pipeline.submit(row["MonitorId"], date_str, row["Id"], start_time=start_time, block=True)
+            self.last_seen = row["Id"]
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                found = self.poll_once()
+            except Exception:
+                logging.exception("EventPoller: falha ao consultar novos eventos.")
+                found = 0
+            # Lote cheio: provavelmente há mais eventos, consulta de novo sem esperar
+            if found < self.batch:
+                self._stop.wait(self.interval)
@@ -0,0 +1,74 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- SERVIDORES DEEPSTACK FALSOS PRA TESTE ---
+# Sobe N servidores locais que imitam /v1/vision/detection, pra testar o
+# balanceamento entre backends (DEEPSTACK_ADDRS) sem precisar do DeepStack real.
+# Ex: python fake_deepstack.py --ports 5001 5002 5003 --latency 0.3 --fail-rate 0.1
+
+def make_handler(latency, fail_rate):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            # Health check: o DeepStack real responde na raiz
+            self._reply(200, {"status": "DeepStack Activated"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            time.sleep(random.uniform(latency * 0.5, latency * 1.5))
+
+            if random.random() < fail_rate:
+                self._reply(500, {"success": False, "error": "falha simulada"})
+                return
+
+            predictions = []
+            if random.random() < 0.5:
+                predictions.append({
+                    "label": random.choice(["person", "car", "dog"]),
+                    "confidence": round(random.uniform(0.65, 0.99), 2),
+                    "x_min": 10, "y_min": 10, "x_max": 110, "y_max": 210
+                })
+            self._reply(200, {"success": True, "predictions": predictions})
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidores DeepStack falsos para teste local.")
+    parser.add_argument("--ports", type=int, nargs="+", default=[5001])
+    parser.add_argument("--latency", type=float, default=0.2, help="latência média por requisição (s)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fração de requisições que retornam 500")
+    args = parser.parse_args()
+
+    servers = []
+    for port in args.ports:
+        server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(args.latency, args.fail_rate))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        print(f"✅ DeepStack falso ouvindo em localhost:{port}")
+
+    print("Use DEEPSTACK_ADDRS = " + str([f"localhost:{p}" for p in args.ports]) + " no config.py. CTRL+C para sair.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,150 @@
 import os
+import time
 import logging
-from config import OUTPUT_DIR, ZM_CACHE_DIR
+from collections.abc import Sequence
+from config import OUTPUT_DIR, ZM_CACHE_DIR, FRAME_STRIDE, STREAM_POLL_INTERVAL, STREAM_DB_CHECK_INTERVAL, STREAM_IDLE_TIMEOUT, STREAM_MAX_SECONDS, ZM_EVENT_IMAGE_DIGITS
 
-def ensure_camera_folder(camera_id):
-    path = os.path.join(OUTPUT_DIR, f"ID_{camera_id}")
+def ensure_camera_folder(camera_id, output_dir=OUTPUT_DIR):
+    path = os.path.join(output_dir, f"ID_{camera_id}")
     os.makedirs(path, mode=0o775, exist_ok=True)
     return path
 
-def ensure_event_folder(camera_id, event_id):
-    cam_folder = ensure_camera_folder(camera_id)
+def ensure_event_folder(camera_id, event_id, output_dir=OUTPUT_DIR):
+    cam_folder = ensure_camera_folder(camera_id, output_dir)
     event_folder = os.path.join(cam_folder, str(event_id))
     os.makedirs(event_folder, mode=0o775, exist_ok=True)
     return event_folder
 
-def get_event_frames(event_id, camera_id, event_date):
+def get_event_path(event_id, camera_id, event_date):
     # Monta o caminho usando o novo volume: /media/srv-sunshield/NovoVolume/Events_ZM/ID/DATA/EVENTO
-    base = os.path.join(
+    return os.path.join(
         ZM_CACHE_DIR,
         str(camera_id),
         event_date,
         str(event_id)
     )
 
+def frame_name(number, digits=ZM_EVENT_IMAGE_DIGITS):
+    """Nome do frame de captura do ZM (ex.: 00042-capture.jpg); passa de `digits` dígitos naturalmente."""
+    return f"{number:0{digits}d}-capture.jpg"
+
+def frame_number(path):
+    """Número do frame a partir do nome (00042-capture.jpg -> 42); None se fora do padrão."""
+    prefix = os.path.basename(path).split("-")[0]
+    return int(prefix) if prefix.isdigit() else None
+
+def _last_frame_number(base):
+    """
+    Número do último frame de captura, sem listar a pasta: o ZM grava os frames em
+    sequência a partir de 1, então basta uma busca exponencial + binária por existência
+    (O(log n) stats). Retorna 0 se o frame 1 não existir.
+    """
+    exists = lambda n: os.path.exists(os.path.join(base, frame_name(n)))
+    if not exists(1):
+        return 0
+    lo, hi = 1, 2
+    while exists(hi):
+        lo, hi = hi, hi * 2
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if exists(mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+def _scan_capture_files(base):
+    """Plano B para nomes fora do padrão: scandir com ordenação numérica (não lexicográfica)."""
+    with os.scandir(base) as it:
+        numbered = [
+            (int(entry.name.split("-")[0]), entry.path)
+            for entry in it
+            if entry.name.endswith("-capture.jpg") and entry.name.split("-")[0].isdigit()
+        ]
+    numbered.sort()
+    return [path for _, path in numbered]
+
+class EventFrames(Sequence):
+    """
+    Frames de um evento calculados pelo número, sem guardar a lista de nomes.
+    Fatias (`frames[::7]`) devolvem outra EventFrames sobre um `range`, então
+    memória e custo não crescem com o tamanho do evento.
+    """
+
+    def __init__(self, base, numbers):
+        self.base    = base
+        self.numbers = numbers
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EventFrames(self.base, self.numbers[index])
+        return os.path.join(self.base, frame_name(self.numbers[index]))
+
+def get_event_frames(event_id, camera_id, event_date):
+    base = get_event_path(event_id, camera_id, event_date)
+
     if not os.path.isdir(base):
         logging.error(f"Pasta de frames ZM não encontrada: {base}")
         return []
 
-    files = sorted(
-        f for f in os.listdir(base)
-        if f.endswith("-capture.jpg") and f.split("-")[0].isdigit()
-    )
+    last = _last_frame_number(base)
+    if last:
+        return EventFrames(base, range(1, last + 1))
+    return _scan_capture_files(base)
+
+def stream_event_frames(event_id, camera_id, event_date, is_closed=None, stride=FRAME_STRIDE,
+                        poll_interval=STREAM_POLL_INTERVAL, idle_timeout=STREAM_IDLE_TIMEOUT,
+                        max_seconds=STREAM_MAX_SECONDS):
+    """
+    Gera os frames amostrados (1 a cada `stride`) assim que estiverem completos,
+    enquanto o ZM ainda grava o evento. Um frame é considerado completo quando o
+    seguinte já existe (o ZM grava em sequência); o último só é liberado quando
+    `is_closed()` indica que o evento terminou ou após `idle_timeout` sem frames novos
+    (ou `max_seconds` no total). A pasta não é listada: só se testa a existência dos
+    próximos números de frame.
+    """
+    base = get_event_path(event_id, camera_id, event_date)
+    exists = lambda n: os.path.exists(os.path.join(base, frame_name(n)))
+
+    next_number  = 1
+    highest      = 0  # maior frame já visto em disco
+    started      = time.monotonic()
+    last_change  = started
+    last_db_check = 0.0
+
+    while True:
+        now = time.monotonic()
+        previous = highest
+        while exists(highest + 1):
+            highest += 1
+
+        changed = highest != previous
+        if changed:
+            last_change = now
+
+        # Só consulta o banco quando a pasta parou de crescer nesta volta
+        finished = False
+        if now - last_change >= idle_timeout or now - started >= max_seconds:
+            finished = True
+        elif is_closed and not changed and now - last_db_check >= STREAM_DB_CHECK_INTERVAL:
+            last_db_check = now
+            finished = bool(is_closed())
+            if finished:
+                # O ZM pode ter gravado os últimos frames antes de fechar o evento
+                while exists(highest + 1):
+                    highest += 1
+
+        complete = highest if finished else highest - 1
+        while next_number <= complete:
+            yield os.path.join(base, frame_name(next_number))
+            next_number += stride
+
+        if finished:
+            if not highest:
+                logging.error(f"Nenhum frame {frame_name(1)} em {base} (pasta vazia, inexistente ou ZM_EVENT_IMAGE_DIGITS incorreto).")
+            return
 
-    return [os.path.join(base, f) for f in files]
\ No newline at end of file
+        time.sleep(poll_interval)
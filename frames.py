@@ -0,0 +1,94 @@
+import io
+from PIL import Image
+from config import DETECTOR_INPUT_SIZE, UPLOAD_JPEG_QUALITY
+
+class PreparedFrame:
+    """
+    Frame pronto para a IA. Lê o arquivo uma vez e gera a versão reduzida para
+    envio usando o modo draft do JPEG (o decoder já descomprime em 1/2, 1/4 ou 1/8
+    do tamanho). A imagem em resolução total só é decodificada se houver recortes
+    a salvar, e no máximo uma vez.
+    """
+
+    def __init__(self, path, max_side=DETECTOR_INPUT_SIZE):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = f.read()
+
+        with Image.open(io.BytesIO(self.data)) as image:  # só lê o cabeçalho
+            self.size = image.size
+        self.max_side   = max_side
+        self._full      = None
+        self._upload    = None
+        self._sent_size = None
+
+    @property
+    def upload(self):
+        """Bytes enviados para a IA (gerados sob demanda: frames descartados pelo pré-filtro não pagam a recodificação)."""
+        if self._upload is None:
+            self._prepare_upload()
+        return self._upload
+
+    @property
+    def sent_size(self):
+        if self._sent_size is None:
+            self._prepare_upload()
+        return self._sent_size
+
+    def _prepare_upload(self):
+        width, height = self.size
+        scale = self.max_side / max(width, height) if self.max_side else 1.0
+        if scale >= 1.0:
+            # Já cabe na entrada do modelo: envia os bytes originais sem recodificar
+            self._upload    = self.data
+            self._sent_size = self.size
+            return
+
+        small = self.scaled_image(self.max_side)
+        target = small.size
+
+        buf = io.BytesIO()
+        small.save(buf, "JPEG", quality=UPLOAD_JPEG_QUALITY)
+        self._upload    = buf.getvalue()
+        self._sent_size = target
+
+    def scaled_image(self, max_side):
+        """Imagem RGB com o maior lado = `max_side` (sem ampliar), decodificada com draft."""
+        width, height = self.size
+        scale = min(1.0, max_side / max(width, height))
+        target = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if self._full is not None:
+            return self._full.resize(target, Image.BILINEAR) if scale < 1.0 else self._full
+        image = Image.open(io.BytesIO(self.data))
+        image.draft("RGB", target)
+        image = image.convert("RGB")
+        if image.size != target:
+            image = image.resize(target, Image.BILINEAR)
+        return image
+
+    def thumbnail(self, side):
+        """Miniatura em tons de cinza (side x side), decodificada em escala reduzida."""
+        image = Image.open(io.BytesIO(self.data))
+        image.draft("L", (side, side))
+        return image.convert("L").resize((side, side), Image.BILINEAR)
+
+    def full_image(self):
+        if self._full is None:
+            self._full = Image.open(io.BytesIO(self.data)).convert("RGB")
+        return self._full
+
+    def to_full(self, predictions):
+        """Converte as caixas retornadas (na imagem enviada) para coordenadas da imagem original."""
+        sx = self.size[0] / self.sent_size[0]
+        sy = self.size[1] / self.sent_size[1]
+        width, height = self.size
+
+        mapped = []
+        for obj in predictions:
+            obj = dict(obj)
+            obj["x_min"] = max(0, min(width,  int(obj["x_min"] * sx)))
+            obj["x_max"] = max(0, min(width,  int(obj["x_max"] * sx)))
+            obj["y_min"] = max(0, min(height, int(obj["y_min"] * sy)))
+            obj["y_max"] = max(0, min(height, int(obj["y_max"] * sy)))
+            mapped.append(obj)
+        return mapped
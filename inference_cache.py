@@ -0,0 +1,90 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from config import INFERENCE_CACHE_SIZE, INFERENCE_CACHE_DIR
+
+class InferenceCache:
+    """
+    Cache de resultados de inferência. A chave é um hash rápido (BLAKE2b) dos
+    bytes do frame mais os parâmetros do detector (backend, modelo, confiança
+    mínima...). Memória limitada com descarte LRU e, opcionalmente, uma camada
+    em disco (um JSON por chave) que sobrevive a reinícios e serve replays.
+    """
+
+    def __init__(self, max_entries=INFERENCE_CACHE_SIZE, disk_dir=INFERENCE_CACHE_DIR):
+        self.max_entries = max_entries
+        self.disk_dir    = disk_dir
+        self._entries    = OrderedDict()
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.disk_hits   = 0
+        self.misses      = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(data, params):
+        h = hashlib.blake2b(data, digest_size=16)
+        h.update(repr(params).encode())
+        return h.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), encoding="utf-8") as f:
+                    predictions = json.load(f)
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, predictions)
+                return predictions
+            except FileNotFoundError:
+                pass
+            except Exception:
+                logging.exception(f"Cache de inferência: erro ao ler {key}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, predictions):
+        self._remember(key, predictions)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(predictions, f)
+                os.replace(tmp_path, path)
+            except Exception:
+                logging.exception(f"Cache de inferência: erro ao gravar {path}")
+
+    def _remember(self, key, predictions):
+        with self._lock:
+            self._entries[key] = predictions
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entradas":   len(self._entries),
+                "acertos":    self.hits,
+                "acertos_disco": self.disk_hits,
+                "faltas":     self.misses,
+                "taxa_acerto": round((self.hits + self.disk_hits) / lookups, 3) if lookups else None,
+            }
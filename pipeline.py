@@ -0,0 +1,165 @@
+import time
+import queue
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from config import WORKER_COUNT, EVENT_QUEUE_SIZE, STAGE_CONCURRENCY, MAX_EVENT_AGE_MINUTES, SHED_BACKLOG_THRESHOLD, SHED_STRIDE_FACTOR
+from scheduler import FairScheduler, job_age
+
+# Job de processamento: o handler do watchdog apenas monta isso e enfileira
+# start_time vem preenchido quando a origem já sabe o StartDateTime (descoberta pelo banco)
+# stride_factor > 1 quando o pipeline está sobrecarregado (amostragem mais espaçada)
+EventJob = namedtuple("EventJob", ["camera_id", "date_str", "event_id", "enqueued_at", "start_time", "stride_factor"], defaults=(None, 1))
+
+_stage_limits = {name: threading.BoundedSemaphore(limit) for name, limit in STAGE_CONCURRENCY.items()}
+_stage_active = {name: 0 for name in STAGE_CONCURRENCY}
+_stage_lock   = threading.Lock()
+
+@contextmanager
+def stage(name):
+    """Limita quantas threads executam um estágio (db, deepstack...) ao mesmo tempo."""
+    sem = _stage_limits.get(name)
+    if sem is None:
+        yield
+        return
+    sem.acquire()
+    with _stage_lock:
+        _stage_active[name] += 1
+    try:
+        yield
+    finally:
+        with _stage_lock:
+            _stage_active[name] -= 1
+        sem.release()
+
+@contextmanager
+def try_stage(name):
+    """Como `stage`, mas sem esperar: entrega False se o estágio já está lotado."""
+    sem = _stage_limits.get(name)
+    if sem is None:
+        yield True
+        return
+    if not sem.acquire(blocking=False):
+        yield False
+        return
+    with _stage_lock:
+        _stage_active[name] += 1
+    try:
+        yield True
+    finally:
+        with _stage_lock:
+            _stage_active[name] -= 1
+        sem.release()
+
+class EventPipeline:
+    """
+    Fila justa por câmera (FairScheduler) + pool de workers que executam
+    `handler(job)` fora da thread do watchdog. Eventos que passam de
+    MAX_EVENT_AGE_MINUTES na fila são descartados com log e entregues a
+    `on_drop(job)`; com a fila acima de SHED_BACKLOG_THRESHOLD os eventos
+    saem com `stride_factor` maior.
+    """
+
+    def __init__(self, handler, workers=WORKER_COUNT, maxsize=EVENT_QUEUE_SIZE, on_drop=None):
+        self.handler  = handler
+        self.on_drop  = on_drop
+        self.workers  = workers
+        self.queue    = FairScheduler(maxsize)
+        self.dropped  = 0
+        self.shed     = 0
+        self._pending = set()
+        self._lock    = threading.Lock()
+        self._threads = []
+        self._busy    = 0
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"event-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logging.info(f"⚙️ Pipeline iniciado com {self.workers} workers (fila máx. {self.queue.maxsize}).")
+
+    def stop(self):
+        self.queue.close()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def submit(self, camera_id, date_str, event_id, start_time=None, block=False):
+        """
+        Enfileira um evento. Retorna False se já estiver pendente ou se a fila estiver cheia.
+        Com `block=True` espera vaga na fila total (para origens que podem aguardar, como o
+        poller do banco); se a sub-fila da câmera estiver cheia, o evento é descartado e
+        entregue a `on_drop` em vez de travar a descoberta das outras câmeras.
+        """
+        key = (str(camera_id), str(event_id))
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+
+        job = EventJob(camera_id, date_str, event_id, time.time(), start_time)
+        try:
+            self.queue.put(job, block=block)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(key)
+            logging.error(f"Fila de eventos cheia (câmera {camera_id}: {self.queue.depths().get(camera_id, 0)}, total: {self.queue.qsize()}). Evento {event_id} descartado.")
+            if block and self.on_drop:
+                # Origem que não reenvia (poller/catch-up): marca para não voltar
+                self.dropped += 1
+                try:
+                    self.on_drop(job)
+                except Exception:
+                    logging.exception(f"Erro ao descartar evento {event_id}")
+            return False
+        return True
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def snapshot(self):
+        """Estado atual da fila e dos estágios, para log/monitoramento."""
+        with _stage_lock:
+            stages = dict(_stage_active)
+        return {"fila": self.queue.qsize(), "por_camera": self.queue.depths(), "workers_ocupados": self._busy,
+                "estagios": stages, "descartados": self.dropped, "amostragem_reduzida": self.shed}
+
+    def expire(self):
+        """Retira da fila os eventos vencidos (chamado periodicamente, não só quando um worker libera)."""
+        for job in self.queue.drop_stale():
+            self._drop(job)
+
+    def _drop(self, job):
+        self.dropped += 1
+        with self._lock:
+            self._pending.discard((str(job.camera_id), str(job.event_id)))
+        logging.warning(f"⏱ Evento {job.event_id} da câmera {job.camera_id} descartado: {job_age(job):.0f}s na fila, acima de {MAX_EVENT_AGE_MINUTES} min.")
+        if self.on_drop:
+            try:
+                self.on_drop(job)
+            except Exception:
+                logging.exception(f"Erro ao descartar evento {job.event_id}")
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            if job_age(job) > MAX_EVENT_AGE_MINUTES * 60:
+                self._drop(job)
+                continue
+            if self.queue.qsize() >= SHED_BACKLOG_THRESHOLD:
+                job = job._replace(stride_factor=SHED_STRIDE_FACTOR)
+                self.shed += 1
+            with self._lock:
+                self._busy += 1
+            try:
+                self.handler(job)
+            except Exception:
+                logging.exception(f"Erro no worker ao processar evento {job.event_id} da câmera {job.camera_id}")
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._pending.discard((str(job.camera_id), str(job.event_id)))
@@ -0,0 +1,49 @@
+import threading
+import numpy as np
+from config import SIMILARITY_THRESHOLD, SIMILARITY_THRESHOLDS, SIMILARITY_THUMB_SIZE
+
+_counters = {"analisados": 0, "ignorados": 0}
+_lock     = threading.Lock()
+
+def counters():
+    """Totais desde o início do processo (frames enviados à IA x ignorados por similaridade)."""
+    with _lock:
+        return dict(_counters)
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+class SimilarityFilter:
+    """
+    Pré-filtro por evento. Compara a miniatura em cinza do frame com a do último
+    frame analisado (diferença absoluta média, 0-255). Abaixo do limiar da câmera o
+    frame é considerado repetido e o resultado anterior é reaproveitado.
+    """
+
+    def __init__(self, camera_id):
+        self.threshold   = SIMILARITY_THRESHOLDS.get(camera_id, SIMILARITY_THRESHOLD)
+        self.skipped     = 0
+        self.last_result = None
+        self._last_thumb = None
+
+    def check(self, frame):
+        """Retorna o resultado reaproveitado se o frame for quase igual ao último analisado; senão None."""
+        if not self.threshold:
+            _count("analisados")
+            return None
+
+        thumb = np.asarray(frame.thumbnail(SIMILARITY_THUMB_SIZE), dtype=np.int16)
+        if self._last_thumb is not None and self.last_result is not None:
+            if np.abs(thumb - self._last_thumb).mean() < self.threshold:
+                self.skipped += 1
+                _count("ignorados")
+                return self.last_result
+
+        self._last_thumb = thumb
+        self.last_result = None
+        _count("analisados")
+        return None
+
+    def remember(self, result):
+        self.last_result = result
@@ -0,0 +1,87 @@
+import os
+import time
+import logging
+import threading
+from config import PROCESSED_FILE, PROCESSED_RETENTION_HOURS, PROCESSED_COMPACT_MIN_LINES
+
+class ProcessedStore:
+    """
+    Eventos já processados, no formato de um set de (camera, evento).
+
+    Cada `add` acrescenta uma linha `camera|evento|timestamp` ao journal (O(1)).
+    Entradas mais velhas que a retenção são descartadas na carga e na compactação,
+    que reescreve o arquivo só com as entradas vivas quando o journal cresce demais
+    ou quando passa do intervalo de retenção desde a última compactação.
+    """
+
+    def __init__(self, path=PROCESSED_FILE, retention_hours=PROCESSED_RETENTION_HOURS):
+        self.path      = path
+        self.retention = retention_hours * 3600
+        self._entries  = {}
+        self._lines    = 0
+        self._lock     = threading.Lock()
+        self._load()
+        self._last_compact = time.time()
+        if self._lines > len(self._entries) + PROCESSED_COMPACT_MIN_LINES:
+            self._compact()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        now     = time.time()
+        cutoff  = now - self.retention
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                self._lines += 1
+                parts = line.strip().split("|")
+                if len(parts) == 2:
+                    # Formato antigo sem timestamp: mantém por uma janela de retenção a partir de agora
+                    parts.append(now)
+                try:
+                    cam, evt, ts = parts[0], parts[1], float(parts[2])
+                except (ValueError, IndexError):
+                    continue
+                if ts >= cutoff:
+                    self._entries[(cam, evt)] = ts
+        logging.info(f"Eventos processados carregados: {len(self._entries)} ({self._lines} linhas no journal).")
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def add(self, key):
+        cam, evt = str(key[0]), str(key[1])
+        with self._lock:
+            if (cam, evt) in self._entries:
+                return
+            ts = time.time()
+            self._entries[(cam, evt)] = ts
+            self._file.write(f"{cam}|{evt}|{ts:.0f}\n")
+            self._file.flush()
+            self._lines += 1
+            if (self._lines > 2 * len(self._entries) + PROCESSED_COMPACT_MIN_LINES
+                    or ts - self._last_compact > self.retention):
+                self._file.close()
+                self._compact()
+                self._file = open(self.path, "a", encoding="utf-8")
+
+    def _compact(self):
+        cutoff = time.time() - self.retention
+        self._entries = {k: ts for k, ts in self._entries.items() if ts >= cutoff}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for (cam, evt), ts in self._entries.items():
+                f.write(f"{cam}|{evt}|{ts:.0f}\n")
+        os.replace(tmp_path, self.path)
+        self._lines = len(self._entries)
+        self._last_compact = time.time()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -2,32 +2,33 @@ import os
 import time
 import json
 import logging
-import shutil
-from config import OUTPUT_DIR, PROCESSED_FILE
-from filesystem import get_event_frames, ensure_event_folder
-from deepstack import analyze_with_deepstack
-from db import get_camera_groups
+from config import OUTPUT_DIR, STREAMING_MODE, FRAME_STRIDE, MIN_DETECTION_FRAMES
+from filesystem import get_event_frames, stream_event_frames, ensure_event_folder, frame_number
+from deepstack import detect_objects, save_tracks, describe
+from tracker import ObjectTracker
+from detectors import get_detector
+from db import get_camera_groups, get_event_end
+from pipeline import stage
+from sampler import AdaptiveSampler, StreamSampler
+from frames import PreparedFrame
+from prefilter import SimilarityFilter
+from artifacts import get_writer
+from processed_store import ProcessedStore
 import stats
 
 last_log_content = None
 
 def load_processed():
-    s = set()
-    if os.path.exists(PROCESSED_FILE):
-        with open(PROCESSED_FILE) as f:
-            for line in f:
-                try:
-                    cam, evt = line.strip().split("|")
-                    s.add((cam, evt))
-                except: continue
-    return s
-
-def save_processed(processed):
-    with open(PROCESSED_FILE, "w") as f:
-        for cam, evt in processed:
-            f.write(f"{cam}|{evt}\n")
-
-def process_event(camera_id, event_date, event_id, processed_events, event_time=None):
+    return ProcessedStore()
+
+def process_event(camera_id, event_date, event_id, processed_events, event_time=None, stride=FRAME_STRIDE,
+                  output_dir=OUTPUT_DIR, streaming=STREAMING_MODE, min_detections=MIN_DETECTION_FRAMES,
+                  dry_run=False, record_stats=True):
+    """
+    Processa um evento e retorna o resumo da decisão (ou None se já processado).
+    O daemon usa os padrões; o replay passa `processed_events=None`, outra
+    `output_dir`, `record_stats=False` e, em dry-run, não grava nada.
+    """
     global last_log_content
 
     # Usa o horario real do ZM para o log e a organizacao de pastas
@@ -35,40 +36,104 @@ def process_event(camera_id, event_date, event_id, processed_events, event_time=
     real_date_str = event_time.strftime("%d-%m-%Y") if event_time else time.strftime("%d-%m-%Y")
 
     key = (str(camera_id), str(event_id))
-    if key in processed_events: return
-
-    frames = get_event_frames(event_id, camera_id, event_date)
-    if not frames:
-        processed_events.add(key)
-        save_processed(processed_events)
-        return
-
-    sampled = frames[::7]
-    count, objects = 0, []
-    event_folder = ensure_event_folder(camera_id, event_id)
-    
-    if not os.path.exists(event_folder): return
-
-    for frame in sampled:
-        if not os.path.exists(event_folder): break
-        detected, objs = analyze_with_deepstack(frame, camera_id, event_folder)
-        if detected:
-            count += 1
-            objects.extend(objs)
-
-    if count < 3:
-        if os.path.exists(event_folder): 
-            shutil.rmtree(event_folder, ignore_errors=True)
+    if processed_events is None:
+        processed_events = set()  # replay: não consulta nem grava o store do daemon
+    if key in processed_events: return None
+
+    if streaming:
+        # Frames chegam conforme o ZM grava; termina quando o evento fecha (EndDateTime) ou fica ocioso
+        def is_closed():
+            with stage("db"):
+                return get_event_end(event_id) is not None
+        sampler = StreamSampler(stream_event_frames(event_id, camera_id, event_date, is_closed=is_closed, stride=stride),
+                                needed=min_detections)
+    else:
+        frames = get_event_frames(event_id, camera_id, event_date)
+        if not frames:
+            processed_events.add(key)
+            return {"aceito": False, "frames": 0, "chamadas_ia": 0, "deteccoes": 0}
+        sampler = AdaptiveSampler(frames, stride=stride, needed=min_detections)
+
+    objects = []
+    tracker = ObjectTracker()
+    event_folder = None
+    if not dry_run:
+        event_folder = ensure_event_folder(camera_id, event_id, output_dir)
+        if not os.path.exists(event_folder): return None
+
+    prefilter = SimilarityFilter(camera_id)
+
+    # No streaming cada frame vai assim que fica pronto; juntar lote atrasaria a primeira detecção
+    batch_size = 1 if streaming else get_detector().batch_size
+
+    while event_folder is None or os.path.exists(event_folder):
+        batch = sampler.take(batch_size)
+        if not batch: break
+
+        pending = []
+        for frame_path in batch:
+            try:
+                frame = PreparedFrame(frame_path)
+            except Exception:
+                logging.exception(f"Erro ao ler a imagem {frame_path} da câmera {camera_id}")
+                sampler.report(False, frame_path)
+                continue
+
+            reused = prefilter.check(frame)
+            if reused is not None:
+                # Frame quase igual ao anterior: reaproveita o resultado sem chamar a IA
+                sampler.report(reused, frame_path)
+                continue
+            pending.append(frame)
+
+        if not pending: continue
+
+        # Detectores com lote (ex.: ONNX) processam os frames pendentes em um único forward
+        with stage("deepstack"):
+            results = detect_objects(pending)
+        for frame, objs in zip(pending, results):
+            detected = bool(objs)
+            # Falha do detector (None, ex.: breaker aberto) não vira "sem detecção" reaproveitável
+            prefilter.remember(detected if objs is not None else None)
+            sampler.report(detected, frame.path)
+            if detected:
+                objects.extend(describe(obj) for obj in objs)
+                number = frame_number(frame.path)
+                tracker.update(number if number is not None else sampler.calls, objs, frame)
+
+    count, analyzed = sampler.hits, sampler.calls
+    inference_calls = analyzed - prefilter.skipped
+    saved = sampler.baseline - inference_calls if sampler.baseline is not None else None
+    if saved is not None:
+        logging.info(f"📉 Evento {event_id}: {inference_calls} chamadas de IA, {saved} economizadas de {sampler.baseline}.")
+    if prefilter.skipped:
+        logging.info(f"📉 Evento {event_id}: {prefilter.skipped} frames repetidos ignorados pelo pré-filtro.")
+
+    result = {"aceito": sampler.accepted, "frames": analyzed, "chamadas_ia": inference_calls, "deteccoes": count}
+
+    if not sampler.accepted:
+        # Nada foi gravado ainda (recortes só saem no aceite); remove a pasta pela fila do writer
+        if event_folder:
+            get_writer().remove_tree(event_folder)
         processed_events.add(key)
-        save_processed(processed_events)
-        return
+        return result
 
-    processed_events.add(key)
-    save_processed(processed_events)
-    stats.increment_with_detections(event_date)
+    result["objetos"] = len(tracker.tracks)
 
-    group_ids = get_camera_groups(camera_id) or ["NENHUM"]
-    daily = os.path.join(OUTPUT_DIR, real_date_str)
+    processed_events.add(key)
+    if dry_run:
+        return result
+
+    # Um recorte por objeto distinto, não um por frame
+    save_tracks(tracker.tracks, camera_id, event_folder)
+    logging.info(f"🧭 Evento {event_id}: {len(tracker.tracks)} objetos distintos em {count} frames com detecção.")
+
+    with stage("db"):
+        group_ids = get_camera_groups(camera_id) or ["NENHUM"]
+    if record_stats:
+        stats.increment_with_detections(event_date, camera_id, hour=int(real_time_str[:2]), groups=group_ids,
+                                        labels=[track.label for track in tracker.tracks])
+    daily = os.path.join(output_dir, real_date_str)
     camera_folder = os.path.join(daily, f"ID_{camera_id}")
     os.makedirs(camera_folder, mode=0o775, exist_ok=True)
 
@@ -76,14 +141,17 @@ def process_event(camera_id, event_date, event_id, processed_events, event_time=
         "data_execucao":      f"{real_date_str} {real_time_str}",
         "camera":             camera_id,
         "evento":             event_id,
-        "frames_analisados":  len(sampled),
+        "frames_analisados":  analyzed,
         "grupo":              group_ids,
-        "resultado":          f"{count} detecções in {len(sampled)} frames.",
-        "objetos_detectados": objects
+        "resultado":          f"{count} detecções in {analyzed} frames.",
+        "chamadas_economizadas": saved,
+        "frames_reaproveitados": prefilter.skipped,
+        "objetos_detectados": objects,
+        "rastros":            tracker.summaries()
     }
 
     text = json.dumps(log_data, indent=4)
-    if text == last_log_content: return
+    if text == last_log_content: return result
 
     group_str = "-".join(map(str, group_ids))
     safe_time = real_time_str.replace(':', '-')
@@ -96,4 +164,5 @@ def process_event(camera_id, event_date, event_id, processed_events, event_time=
         logging.info(f"✅ Evento {event_id} processado (Hora: {real_time_str})")
         last_log_content = text
     except Exception:
-        logging.exception(f"Erro ao salvar log: {path}")
\ No newline at end of file
+        logging.exception(f"Erro ao salvar log: {path}")
+    return result
\ No newline at end of file
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import OUTPUT_DIR, ZM_CACHE_DIR, FRAME_STRIDE, MIN_DETECTION_FRAMES, reset_logging_in_child
+from processor import process_event
+from artifacts import get_writer
+from db import get_event_data
+
+# --- REPLAY / BACKFILL ---
+# Reprocessa eventos antigos do ZM com a lógica atual de detecção (ALLOWED_LABELS,
+# confiança, passo, limiar...) e grava o resultado em outra pasta, sem mexer no
+# OUTPUT_DIR, nas estatísticas ou no processed_events.txt do daemon.
+# Ex: python replay.py --from 2025-07-01 --to 2025-07-07 --cameras 11 12 --output /tmp/replay --workers 8
+#     python replay.py --from 2025-07-01 --to 2025-07-01 --dry-run --stride 5 --min-detections 2
+
+def find_events(cameras, date_from, date_to):
+    """Percorre ZM_CACHE_DIR/<camera>/<YYYY-MM-DD>/<evento> dentro do intervalo."""
+    if not cameras:
+        cameras = sorted(int(d) for d in os.listdir(ZM_CACHE_DIR) if d.isdigit())
+
+    events = []
+    for camera_id in cameras:
+        cam_path = os.path.join(ZM_CACHE_DIR, str(camera_id))
+        if not os.path.isdir(cam_path):
+            continue
+        for date_str in sorted(os.listdir(cam_path)):
+            try:
+                day = datetime.strptime(date_str, "%Y-%m-%d").date()
+            except ValueError:
+                continue
+            if not (date_from <= day <= date_to):
+                continue
+            with os.scandir(os.path.join(cam_path, date_str)) as it:
+                for entry in it:
+                    if entry.is_dir() and entry.name.isdigit():
+                        events.append((camera_id, date_str, int(entry.name), entry.stat().st_mtime))
+    return events
+
+def replay_event(camera_id, date_str, event_id, mtime, output_dir, stride, min_detections, dry_run):
+    event_time = get_event_data(event_id) or datetime.fromtimestamp(mtime)
+    result = process_event(
+        camera_id, date_str, event_id, None, event_time,
+        stride=stride, output_dir=output_dir, streaming=False, min_detections=min_detections,
+        dry_run=dry_run, record_stats=False
+    )
+    if not dry_run:
+        get_writer().flush()  # em processos filhos, garante os recortes antes de devolver
+    return camera_id, event_id, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocessa eventos históricos do ZoneMinder em paralelo.")
+    parser.add_argument("--from", dest="date_from", required=True, help="data inicial (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", required=True, help="data final (YYYY-MM-DD)")
+    parser.add_argument("--cameras", type=int, nargs="*", help="IDs das câmeras (padrão: todas)")
+    parser.add_argument("--output", help="pasta de saída (obrigatória fora do dry-run)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", action="store_true", help="usa processos em vez de threads")
+    parser.add_argument("--stride", type=int, default=FRAME_STRIDE)
+    parser.add_argument("--min-detections", type=int, default=MIN_DETECTION_FRAMES)
+    parser.add_argument("--dry-run", action="store_true", help="só calcula a decisão, não grava recortes nem logs")
+    args = parser.parse_args()
+
+    if not args.dry_run and not args.output:
+        parser.error("--output é obrigatório sem --dry-run")
+    if args.output and os.path.abspath(args.output) in (os.path.abspath(OUTPUT_DIR), os.path.abspath(ZM_CACHE_DIR)):
+        parser.error("--output deve ser uma pasta separada do OUTPUT_DIR e do ZM_CACHE_DIR")
+
+    date_from = datetime.strptime(args.date_from, "%Y-%m-%d").date()
+    date_to   = datetime.strptime(args.date_to, "%Y-%m-%d").date()
+    events = find_events(args.cameras, date_from, date_to)
+    if not events:
+        print("Nenhum evento encontrado no intervalo.")
+        return
+    print(f"--- Replay de {len(events)} eventos ({args.workers} {'processos' if args.processes else 'threads'}) ---")
+
+    if args.processes:
+        # Cada processo precisa da própria thread de log (a do pai não existe após o fork)
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=reset_logging_in_child)
+    else:
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+    started = time.perf_counter()
+    decisions, frames, calls = [], 0, 0
+    with executor as pool:
+        futures = [
+            pool.submit(replay_event, cam, day, evt, mtime, args.output, args.stride, args.min_detections, args.dry_run)
+            for cam, day, evt, mtime in events
+        ]
+        for future in futures:
+            try:
+                camera_id, event_id, result = future.result()
+            except Exception:
+                logging.exception("Erro no replay de um evento")
+                continue
+            if result is None:
+                continue
+            frames += result["frames"]
+            calls  += result["chamadas_ia"]
+            decisions.append({"camera": camera_id, "evento": event_id, **result})
+
+    elapsed  = time.perf_counter() - started
+    accepted = sum(1 for d in decisions if d["aceito"])
+    summary = {
+        "intervalo":        [args.date_from, args.date_to],
+        "eventos":          len(decisions),
+        "aceitos":          accepted,
+        "frames":           frames,
+        "chamadas_ia":      calls,
+        "segundos":         round(elapsed, 2),
+        "eventos_por_s":    round(len(decisions) / elapsed, 2),
+        "frames_por_s":     round(frames / elapsed, 2),
+        "passo":            args.stride,
+        "min_deteccoes":    args.min_detections,
+        "decisoes":         decisions,
+    }
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        with open(os.path.join(args.output, "replay_summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+
+    print(f"✅ {len(decisions)} eventos ({accepted} aceitos) em {elapsed:.1f}s: "
+          f"{summary['eventos_por_s']} eventos/s, {summary['frames_por_s']} frames/s, {calls} chamadas de IA.")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import os
+import time
+import sqlite3
+import shutil
+import logging
+import threading
+from datetime import datetime
+from config import OUTPUT_DIR, ZM_CACHE_DIR, RETENTION_INDEX_FILE, RETENTION_HIGH_WATERMARK, RETENTION_LOW_WATERMARK, \
+    RETENTION_CAMERA_QUOTAS_GB, RETENTION_CHECK_SECONDS, RETENTION_RESCAN_HOURS
+from cleaner import CleanupRun, _delete_tree
+
+def _measure(path):
+    """Bytes e arquivos de uma pasta de evento (um nível só, que é como ZM e writer gravam)."""
+    size = files = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    size  += entry.stat(follow_symlinks=False).st_size
+                    files += 1
+    except FileNotFoundError:
+        pass
+    return size, files
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS usage (
+        path   TEXT    PRIMARY KEY,
+        area   TEXT    NOT NULL,
+        camera TEXT    NOT NULL,
+        day    TEXT    NOT NULL,
+        bytes  INTEGER NOT NULL DEFAULT 0,
+        files  INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS usage_camera_day ON usage (camera, day)",
+    "CREATE INDEX IF NOT EXISTS usage_day ON usage (day)",
+    "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value REAL NOT NULL)",
+)
+
+_ADD = """
+INSERT INTO usage (path, area, camera, day, bytes, files) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (path) DO UPDATE SET bytes = bytes + excluded.bytes, files = files + excluded.files
+"""
+
+_SET = """
+INSERT INTO usage (path, area, camera, day, bytes, files) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (path) DO UPDATE SET bytes = excluded.bytes, files = excluded.files
+"""
+
+class UsageIndex:
+    """
+    Uso de disco por (área, câmera, dia), com o tamanho de cada pasta de evento, em SQLite.
+    Áreas: "zm" (ZM_CACHE_DIR/<câmera>/<dia>/<evento>) e "output" (OUTPUT_DIR/ID_<câmera>/<evento>,
+    datada pelo dia da primeira gravação). Cada gravação do writer de artefatos, evento do
+    ZM processado (watcher) ou remoção do cleaner é um upsert/delete de uma linha; os totais
+    por câmera saem de consultas agregadas. O varrimento completo só acontece com o índice
+    vazio ou a cada RETENTION_RESCAN_HOURS.
+    """
+
+    def __init__(self, path=RETENTION_INDEX_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # índice é reconstruível: não precisa de fsync por gravação
+        with self.conn:
+            for statement in _SCHEMA:
+                self.conn.execute(statement)
+
+    @property
+    def scanned(self):
+        """time.time() do último varrimento completo (0 se nunca houve)."""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = 'scanned'").fetchone()
+        return row[0] if row else 0
+
+    def add(self, area, camera, day, path, size, files=1):
+        with self.lock, self.conn:
+            self.conn.execute(_ADD, (path, area, str(camera), day, size, files))
+
+    def set(self, area, camera, day, path, size, files):
+        with self.lock, self.conn:
+            self.conn.execute(_SET, (path, area, str(camera), day, size, files))
+
+    def forget(self, path):
+        """Remove a pasta (e tudo indexado abaixo dela) do índice; chamado após cada remoção."""
+        prefix = path.rstrip(os.sep) + os.sep
+        with self.lock, self.conn:
+            # Faixa do prefixo pela chave primária, sem varrer a tabela
+            self.conn.execute("DELETE FROM usage WHERE path = ? OR (path >= ? AND path < ?)",
+                              (path, prefix, prefix[:-1] + chr(ord(os.sep) + 1)))
+
+    def totals(self, by="camera"):
+        """Bytes somados por câmera (`by="camera"`) ou por área."""
+        column = "camera" if by == "camera" else "area"
+        with self.lock:
+            rows = self.conn.execute(f"SELECT {column}, SUM(bytes) FROM usage GROUP BY {column}").fetchall()
+        return dict(rows)
+
+    def oldest(self, camera=None, before_day=None):
+        """Pastas em ordem de remoção (dia mais antigo primeiro), opcionalmente de uma câmera."""
+        query, params = "SELECT day, path, bytes FROM usage WHERE 1 = 1", []
+        if camera is not None:
+            query += " AND camera = ?"
+            params.append(str(camera))
+        if before_day is not None:
+            query += " AND day < ?"
+            params.append(before_day)
+        with self.lock:
+            return self.conn.execute(query + " ORDER BY day, path", params).fetchall()
+
+    def rescan(self):
+        """Varrimento completo (scandir) de ZM_CACHE_DIR e das pastas de evento do OUTPUT_DIR."""
+        rows = []
+        for cam in _dirs(ZM_CACHE_DIR):
+            if not cam.name.isdigit():
+                continue
+            for day in _dirs(cam.path):
+                for event in _dirs(day.path):
+                    size, files = _measure(event.path)
+                    rows.append((event.path, "zm", cam.name, day.name, size, files))
+        for cam in _dirs(OUTPUT_DIR):
+            if not cam.name.startswith("ID_"):
+                continue
+            for event in _dirs(cam.path):
+                size, files = _measure(event.path)
+                day = datetime.fromtimestamp(event.stat(follow_symlinks=False).st_mtime).strftime("%Y-%m-%d")
+                rows.append((event.path, "output", cam.name[3:], day, size, files))
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM usage")
+            self.conn.executemany(_SET, rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('scanned', ?)", (time.time(),))
+        logging.info(f"📦 Índice de uso reconstruído: {len(rows)} pastas, {sum(r[4] for r in rows) / 1024 ** 3:.2f} GB.")
+
+def _dirs(path):
+    try:
+        with os.scandir(path) as it:
+            return [entry for entry in it if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+
+_usage = None
+_usage_lock = threading.Lock()
+
+def get_usage():
+    global _usage
+    with _usage_lock:
+        if _usage is None:
+            _usage = UsageIndex()
+        return _usage
+
+def _output_camera(event_dir):
+    """Câmera de uma pasta OUTPUT_DIR/ID_<câmera>/<evento>, ou None se a pasta é de outro lugar."""
+    cam_dir = os.path.dirname(event_dir)
+    if os.path.dirname(cam_dir) != OUTPUT_DIR.rstrip(os.sep) or not os.path.basename(cam_dir).startswith("ID_"):
+        return None  # ex.: saída do replay em outra pasta
+    return os.path.basename(cam_dir)[3:]
+
+def record_artifact(path, size):
+    """Chamado pelo writer após gravar um recorte/frame em OUTPUT_DIR/ID_<câmera>/<evento>/."""
+    event_dir = os.path.dirname(path)
+    camera = _output_camera(event_dir)
+    if camera is not None:
+        get_usage().add("output", camera, time.strftime("%Y-%m-%d"), event_dir, size)
+
+def forget_artifacts(event_dir):
+    """Chamado pelo writer após apagar a pasta de um evento rejeitado."""
+    if _output_camera(event_dir) is not None:
+        get_usage().forget(event_dir)
+
+def record_zm_event(camera_id, date_str, event_path):
+    """Chamado depois de processar um evento do ZM: mede a pasta e atualiza o índice."""
+    size, files = _measure(event_path)
+    if files:
+        get_usage().set("zm", camera_id, date_str, event_path, size, files)
+
+class RetentionManager:
+    """
+    Retenção por espaço em disco, além da idade (cleaner): a cada RETENTION_CHECK_SECONDS
+    aplica as cotas por câmera (RETENTION_CAMERA_QUOTAS_GB) e, se algum volume passar de
+    RETENTION_HIGH_WATERMARK, remove os dias mais antigos até voltar a RETENTION_LOW_WATERMARK.
+    O dia corrente nunca é removido. Tudo sai do índice de uso, sem varrer as árvores.
+    """
+
+    def __init__(self, usage, should_yield=None, high=RETENTION_HIGH_WATERMARK, low=RETENTION_LOW_WATERMARK,
+                 quotas_gb=RETENTION_CAMERA_QUOTAS_GB, interval=RETENTION_CHECK_SECONDS):
+        self.usage        = usage
+        self.should_yield = should_yield
+        self.high         = high
+        self.low          = low
+        self.quotas       = {str(cam): gb * 1024 ** 3 for cam, gb in quotas_gb.items()}
+        self.interval     = interval
+        self.thread       = threading.Thread(target=self._run, daemon=True, name="retention")
+
+    def start(self):
+        self.thread.start()
+
+    def _evict(self, candidates, target_bytes, run, reason):
+        """Remove pastas até liberar `target_bytes`, contando só o que saiu de fato do disco."""
+        freed = 0
+        for day, path, size in candidates:
+            if freed >= target_bytes or run.exhausted:
+                break
+            before, denied = run.bytes, len(run.denied)
+            _delete_tree(path, run, f"Retenção ({reason}, dia {day})")
+            freed += run.bytes - before
+            if len(run.denied) > denied:
+                # Vai no sudo único do final da rodada: conta agora para não remover além da meta
+                freed += size
+            # Pasta do dia do ZM fica vazia quando o último evento sai
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
+        return freed
+
+    def check(self):
+        today = time.strftime("%Y-%m-%d")
+        run = CleanupRun(should_yield=self.should_yield, on_removed=self.usage.forget)
+
+        # Cotas por câmera
+        totals = self.usage.totals()
+        for cam, quota in self.quotas.items():
+            excess = totals.get(cam, 0) - quota
+            if excess > 0:
+                freed = self._evict(self.usage.oldest(cam, before_day=today), excess, run, f"cota da câmera {cam}")
+                logging.warning(f"📦 Câmera {cam} acima da cota: {freed / 1024 ** 2:.0f} MB liberados.")
+
+        # Marcas d'água por volume (OUTPUT_DIR e ZM_CACHE_DIR podem estar no mesmo disco)
+        volumes = {}
+        for root in (OUTPUT_DIR, ZM_CACHE_DIR):
+            try:
+                volumes.setdefault(os.stat(root).st_dev, []).append(root)
+            except FileNotFoundError:
+                continue
+        for roots in volumes.values():
+            disk = shutil.disk_usage(roots[0])
+            if disk.used / disk.total < self.high:
+                continue
+            target = disk.used - self.low * disk.total
+            prefixes = tuple(root.rstrip(os.sep) + os.sep for root in roots)
+            candidates = [c for c in self.usage.oldest(before_day=today) if c[1].startswith(prefixes)]
+            freed = self._evict(candidates, target, run, "disco cheio")
+            logging.warning(f"📦 Volume de {roots[0]} em {disk.used / disk.total:.0%}: {freed / 1024 ** 3:.2f} GB liberados "
+                            f"(meta {target / 1024 ** 3:.2f} GB).")
+        run.finish()
+
+    def _run(self):
+        while True:
+            try:
+                if time.time() - self.usage.scanned >= RETENTION_RESCAN_HOURS * 3600:
+                    self.usage.rescan()
+                self.check()
+            except Exception:
+                logging.exception("Erro na retenção por espaço em disco.")
+            time.sleep(self.interval)
+
+def start_retention(should_yield=None):
+    manager = RetentionManager(get_usage(), should_yield)
+    manager.start()
+    return manager
@@ -0,0 +1,229 @@
+import os
+import json
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
+from config import OUTPUT_DIR, ROLLUP_DB
+
+LEVELS = ("hour", "day", "month", "year")
+
+_FORMATS = {
+    "hour":  "%Y-%m-%d %H",
+    "day":   "%Y-%m-%d",
+    "month": "%Y-%m",
+    "year":  "%Y",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup (
+    level           TEXT    NOT NULL,
+    bucket          TEXT    NOT NULL,
+    dim             TEXT    NOT NULL,
+    key             TEXT    NOT NULL,
+    total           INTEGER NOT NULL DEFAULT 0,
+    with_detections INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (level, dim, key, bucket)
+)
+"""
+
+_UPSERT = """
+INSERT INTO rollup (level, bucket, dim, key, total, with_detections) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (level, dim, key, bucket) DO UPDATE SET
+    total           = total + excluded.total,
+    with_detections = with_detections + excluded.with_detections
+"""
+
+def _next(level, moment):
+    if level == "hour":
+        return moment + timedelta(hours=1)
+    if level == "day":
+        return moment + timedelta(days=1)
+    # Parte do dia 1: replace(month=...) no dia 31 (ou 29/02 no ano) não existe
+    if level == "month":
+        return moment.replace(day=1, year=moment.year + moment.month // 12, month=moment.month % 12 + 1)
+    return moment.replace(day=1, month=1, year=moment.year + 1)
+
+def _is_start(level, moment):
+    if level == "hour":
+        return True
+    if level == "day":
+        return moment.hour == 0
+    if level == "month":
+        return moment.hour == 0 and moment.day == 1
+    return moment.hour == 0 and moment.day == 1 and moment.month == 1
+
+def align(start, end):
+    """[start, end) estendido às horas inteiras, que é exatamente o que `cover` soma."""
+    start = start.replace(minute=0, second=0, microsecond=0)
+    floor = end.replace(minute=0, second=0, microsecond=0)
+    return start, (floor if floor == end else floor + timedelta(hours=1))
+
+def cover(start, end):
+    """
+    Quebra [start, end) no menor conjunto de baldes (ano > mês > dia > hora), então
+    um ano inteiro custa um balde e as pontas no máximo algumas dezenas de horas.
+    """
+    cursor = start.replace(minute=0, second=0, microsecond=0)
+    buckets = []
+    while cursor < end:
+        for level in reversed(LEVELS):
+            if not _is_start(level, cursor):
+                continue
+            following = _next(level, cursor)
+            if following <= end or level == "hour":
+                buckets.append((level, cursor.strftime(_FORMATS[level])))
+                cursor = following
+                break
+    return buckets
+
+class RollupStore:
+    """
+    Série temporal compacta das estatísticas em SQLite: cada contador é somado nos
+    baldes de hora, dia, mês e ano, por dimensão ("*", "camera", "grupo", "label").
+    Atualizada de forma incremental a cada flush do StatsAggregator; consultas de
+    intervalo usam `cover` e leem poucos registros, sem abrir arquivos por dia.
+    """
+
+    def __init__(self, path=ROLLUP_DB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        # WAL: a API lê enquanto o daemon grava
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(_SCHEMA)
+        self.conn.commit()
+
+    def add(self, counts):
+        """`counts`: {(datetime da hora, dim, key, campo): quantidade}, somado em todos os níveis."""
+        rows = {}
+        for (moment, dim, key, field), amount in counts.items():
+            for level in LEVELS:
+                row = rows.setdefault((level, moment.strftime(_FORMATS[level]), dim, str(key)), [0, 0])
+                row[0 if field == "total" else 1] += amount
+        with self.lock, self.conn:
+            self.conn.executemany(_UPSERT, [key + tuple(values) for key, values in rows.items()])
+
+    def query(self, start, end, dim="*", key="*"):
+        """Totais de [start, end) para uma dimensão (ex.: dim="camera", key="3")."""
+        by_level = {}
+        for level, bucket in cover(start, end):
+            by_level.setdefault(level, []).append(bucket)
+
+        total = with_det = 0
+        with self.lock:
+            for level, buckets in by_level.items():
+                marks = ",".join("?" * len(buckets))
+                row = self.conn.execute(
+                    f"SELECT COALESCE(SUM(total), 0), COALESCE(SUM(with_detections), 0) FROM rollup "
+                    f"WHERE level = ? AND dim = ? AND key = ? AND bucket IN ({marks})",
+                    (level, dim, str(key), *buckets),
+                ).fetchone()
+                total    += row[0]
+                with_det += row[1]
+        return {"total_events": total, "with_detections": with_det}
+
+    def series(self, start, end, level, dim="*", key="*"):
+        """Um ponto por balde do nível pedido, em ordem (baldes sem evento não aparecem)."""
+        first = start.strftime(_FORMATS[level])
+        last  = (end - timedelta(microseconds=1)).strftime(_FORMATS[level])
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT bucket, total, with_detections FROM rollup "
+                "WHERE level = ? AND dim = ? AND key = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+                (level, dim, str(key), first, last),
+            ).fetchall()
+        return [{"balde": b, "total_events": t, "with_detections": w} for b, t, w in rows]
+
+    def first_day(self):
+        """Primeiro dia com dados no rollup (None se vazio)."""
+        with self.lock:
+            return self.conn.execute("SELECT MIN(bucket) FROM rollup WHERE level = 'day'").fetchone()[0]
+
+    def breakdown(self, level, bucket):
+        """Todas as dimensões de um balde (ex.: ("month", "2025-07")) no formato dos arquivos de stats."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT dim, key, total, with_detections FROM rollup WHERE level = ? AND bucket = ?",
+                (level, bucket),
+            ).fetchall()
+        if not rows:
+            return None
+        result = {}
+        for dim, key, total, with_det in rows:
+            if dim == "*":
+                result["total_events"] = total
+                result["with_detections"] = with_det
+            else:
+                result.setdefault(f"por_{dim}", {})[key] = {"total": total, "with_detections": with_det}
+        return result
+
+    def month_summary(self, year, month):
+        """Resumo do mês a partir do rollup, ou None se o rollup não cobre o mês inteiro."""
+        first = self.first_day()
+        if first is None or first > f"{int(year):04d}-{int(month):02d}-01":
+            return None
+        return self.breakdown("month", f"{int(year):04d}-{int(month):02d}") or {"total_events": 0, "with_detections": 0}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RollupStore()
+        return _store
+
+def rebuild(output_dir=OUTPUT_DIR):
+    """
+    Importa os events_stats.json anteriores ao rollup: só dias antes do primeiro dia
+    já presente no store, para não contar nada em dobro (pode rodar com o daemon no ar).
+    Arquivos antigos não têm hora por câmera: as quebras por câmera/grupo/label
+    entram na hora 00 do dia, o que só afeta consultas por hora desses dias.
+    """
+    store = get_store()
+    cutoff = store.first_day()
+    stats_dir = os.path.join(output_dir, "Stats")
+    counts = {}
+    for year in sorted(os.listdir(stats_dir)) if os.path.isdir(stats_dir) else []:
+        year_dir = os.path.join(stats_dir, year)
+        if not year.isdigit() or not os.path.isdir(year_dir):
+            continue
+        for month in os.listdir(year_dir):
+            month_dir = os.path.join(year_dir, month)
+            if not month.isdigit() or not os.path.isdir(month_dir):
+                continue
+            for day in os.listdir(month_dir):
+                stat_file = os.path.join(month_dir, day, "events_stats.json")
+                if not os.path.isfile(stat_file):
+                    continue
+                try:
+                    with open(stat_file, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    midnight = datetime(int(year), int(month), int(day))
+                except Exception:
+                    logging.exception(f"Rollup: ignorando {stat_file}")
+                    continue
+                if cutoff and midnight.strftime(_FORMATS["day"]) >= cutoff:
+                    continue
+
+                hours = data.get("por_hora")
+                for field in ("total", "with_detections"):
+                    if hours:
+                        for hour, values in hours.items():
+                            counts[(midnight.replace(hour=int(hour)), "*", "*", field)] = values.get(field, 0)
+                    else:
+                        counts[(midnight, "*", "*", field)] = data.get(field, 0)
+                    for dim in ("camera", "grupo", "label"):
+                        for key, values in data.get(f"por_{dim}", {}).items():
+                            counts[(midnight, dim, key, field)] = values.get(field, 0)
+    store.add(counts)
+    logging.info(f"📚 Rollup: {len(counts)} contadores importados de {stats_dir}" + (f" (dias antes de {cutoff})." if cutoff else "."))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa os arquivos de estatísticas diários para o rollup (SQLite).")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="pasta base com a subpasta Stats")
+    args = parser.parse_args()
+    rebuild(args.output)
@@ -0,0 +1,114 @@
+from collections import deque
+from config import FRAME_STRIDE, MIN_DETECTION_FRAMES, ADAPTIVE_SAMPLING, SAMPLING_COARSE_FACTOR
+
+class _Sampler:
+    def take(self, n):
+        """Próximos `n` frames (ou menos, se a decisão já estiver tomada), para inferência em lote."""
+        batch = []
+        while len(batch) < n:
+            frame = self._next_frame()
+            if frame is None:
+                break
+            batch.append(frame)
+        return batch
+
+    def __iter__(self):
+        # Reavalia a cada frame: refinamentos enfileirados por `report` entram na sequência
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return
+            yield frame
+
+class AdaptiveSampler(_Sampler):
+    """
+    Escolhe quais frames do evento vão para a IA.
+
+    Começa com um passo grosso (FRAME_STRIDE * SAMPLING_COARSE_FACTOR) e só refina
+    (passo FRAME_STRIDE) em volta dos frames que tiveram detecção. Para assim que a
+    decisão está garantida: `needed` acertos (aceita) ou quando nem todos os frames
+    restantes da grade fina alcançariam `needed` (rejeita).
+
+    Uso: `for frame in sampler: ...; sampler.report(detected, frame)`, ou em lotes com `take(n)`.
+    """
+
+    def __init__(self, frames, stride=FRAME_STRIDE, needed=MIN_DETECTION_FRAMES, adaptive=ADAPTIVE_SAMPLING):
+        self.frames   = frames
+        self.stride   = stride
+        self.factor   = SAMPLING_COARSE_FACTOR if adaptive else 1
+        self.needed   = needed
+        self.baseline = len(range(0, len(frames), stride))  # chamadas do modelo antigo (frames[::stride])
+        self.hits     = 0
+        self.calls    = 0
+
+        self._coarse  = deque(range(0, len(frames), stride * self.factor))
+        self._refine  = deque()
+        self._visited = set()
+        self._index   = {}
+
+    @property
+    def accepted(self):
+        return self.hits >= self.needed
+
+    @property
+    def settled(self):
+        remaining = self.baseline - len(self._visited)
+        return self.accepted or self.hits + remaining < self.needed
+
+    def _next_frame(self):
+        if self.settled:
+            return None
+        idx = self._next_index()
+        if idx is None:
+            return None
+        self._visited.add(idx)
+        self.calls += 1
+        frame = self.frames[idx]
+        self._index[frame] = idx
+        return frame
+
+    def report(self, detected, frame):
+        if not detected:
+            return
+        self.hits += 1
+        # Refina ao redor do acerto, dentro da janela do passo grosso
+        current = self._index[frame]
+        for k in range(1, self.factor):
+            for idx in (current - k * self.stride, current + k * self.stride):
+                if 0 <= idx < len(self.frames) and idx not in self._visited:
+                    self._refine.append(idx)
+
+    def _next_index(self):
+        for source in (self._refine, self._coarse):
+            while source:
+                idx = source.popleft()
+                if idx not in self._visited:
+                    return idx
+        return None
+
+class StreamSampler(_Sampler):
+    """Equivalente para o modo streaming: frames chegam em ordem, então só há parada antecipada por aceite."""
+
+    def __init__(self, frames, needed=MIN_DETECTION_FRAMES):
+        self.frames   = frames
+        self.needed   = needed
+        self.baseline = None
+        self.hits     = 0
+        self.calls    = 0
+        self._frames  = iter(frames)
+
+    @property
+    def accepted(self):
+        return self.hits >= self.needed
+
+    def _next_frame(self):
+        if self.accepted:
+            return None
+        frame = next(self._frames, None)
+        if frame is not None:
+            self.calls += 1
+        return frame
+
+    def report(self, detected, frame=None):
+        if detected:
+            self.hits += 1
@@ -0,0 +1,113 @@
+import time
+import queue
+import threading
+from collections import deque
+from config import CAMERA_PRIORITIES, CAMERA_QUEUE_SIZE, MAX_EVENT_AGE_MINUTES
+
+def job_age(job, now=None):
+    """Idade do evento em segundos (StartDateTime se conhecido, senão a hora em que entrou na fila)."""
+    now = now or time.time()
+    origin = job.start_time.timestamp() if job.start_time else job.enqueued_at
+    return now - origin
+
+class FairScheduler:
+    """
+    Fila com uma sub-fila por câmera e despacho round-robin ponderado: em cada
+    volta a câmera atende até `CAMERA_PRIORITIES.get(camera, 1)` eventos antes de
+    passar a vez. Uma câmera "tagarela" só enche a própria sub-fila
+    (CAMERA_QUEUE_SIZE) e não atrasa as outras.
+
+    Mesma interface usada do queue.Queue pelo pipeline (put/get/qsize), mais
+    `drop_stale` para retirar eventos que passaram de MAX_EVENT_AGE_MINUTES.
+    """
+
+    def __init__(self, maxsize, per_camera=CAMERA_QUEUE_SIZE, priorities=CAMERA_PRIORITIES):
+        self.maxsize    = maxsize
+        self.per_camera = per_camera
+        self.priorities = priorities
+        self._queues    = {}
+        self._active    = deque()  # câmeras com eventos, na ordem de atendimento
+        self._credit    = {}
+        self._size      = 0
+        self._closed    = False
+        self._cond      = threading.Condition()
+
+    def _has_room(self, camera_id):
+        return self._size < self.maxsize and len(self._queues.get(camera_id, ())) < self.per_camera
+
+    def _camera_full(self, camera_id):
+        return len(self._queues.get(camera_id, ())) >= self.per_camera
+
+    def put(self, job, block=False, timeout=None):
+        """
+        `block` só espera pela fila total: com a sub-fila da própria câmera cheia levanta
+        queue.Full na hora, senão uma câmera ocupada travaria quem enfileira para todas.
+        """
+        with self._cond:
+            if not self._has_room(job.camera_id):
+                if not block or self._camera_full(job.camera_id):
+                    raise queue.Full
+                self._cond.wait_for(lambda: self._has_room(job.camera_id) or self._camera_full(job.camera_id), timeout)
+                if not self._has_room(job.camera_id):
+                    raise queue.Full
+            q = self._queues.setdefault(job.camera_id, deque())
+            if not q:
+                self._active.append(job.camera_id)
+            q.append(job)
+            self._size += 1
+            self._cond.notify_all()
+
+    def get(self):
+        """Próximo evento pela ordem justa. Retorna None depois de `close()` e da fila esvaziar."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._size or self._closed)
+            if not self._size:
+                return None
+            job = self._pop()
+            self._cond.notify_all()
+            return job
+
+    def _pop(self):
+        camera_id = self._active[0]
+        q = self._queues[camera_id]
+        if self._credit.get(camera_id, 0) <= 0:
+            self._credit[camera_id] = max(1, self.priorities.get(camera_id, 1))
+        job = q.popleft()
+        self._size -= 1
+        self._credit[camera_id] -= 1
+        if not q:
+            self._active.popleft()
+            self._credit.pop(camera_id, None)
+        elif self._credit[camera_id] <= 0:
+            self._active.rotate(-1)
+        return job
+
+    def drop_stale(self, max_age=MAX_EVENT_AGE_MINUTES * 60):
+        """Remove e retorna os eventos que já passaram da idade máxima esperando na fila."""
+        now, dropped = time.time(), []
+        with self._cond:
+            for camera_id in list(self._active):
+                q = self._queues[camera_id]
+                keep = deque(job for job in q if job_age(job, now) <= max_age)
+                dropped.extend(job for job in q if job_age(job, now) > max_age)
+                self._queues[camera_id] = keep
+                if not keep:
+                    self._active.remove(camera_id)
+                    self._credit.pop(camera_id, None)
+            self._size -= len(dropped)
+            if dropped:
+                self._cond.notify_all()
+        return dropped
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def qsize(self):
+        with self._cond:
+            return self._size
+
+    def depths(self):
+        with self._cond:
+            return {camera_id: len(self._queues[camera_id]) for camera_id in self._active}
@@ -1,8 +1,12 @@
 import os
 import json
 import time
+import atexit
 import logging
-from config import OUTPUT_DIR
+import threading
+from datetime import datetime
+from config import OUTPUT_DIR, STATS_FLUSH_SECONDS
+import rollups
 
 def _ensure_stats_dir(date_str):
     year, month, day = date_str.split('-')
@@ -21,54 +25,162 @@ def _load_stats(file_path):
     return {'total': 0, 'with_detections': 0, 'last_updated': None}
 
 def _save_stats(file_path, data):
+    # Escrita atômica: a API nunca lê um JSON pela metade
+    tmp_path = os.path.join(os.path.dirname(file_path), f".{os.path.basename(file_path)}.tmp")
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4)
+        os.replace(tmp_path, file_path)
     except Exception:
         logging.exception(f"Erro ao gravar estatísticas em {file_path}")
 
-def increment_total(date_str):
+def _merge(target, delta):
+    """Soma `delta` em `target`, descendo nos dicionários aninhados (quebras por câmera, hora...)."""
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            _merge(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+class StatsAggregator:
+    """
+    Contadores do dia em memória; o incremento por evento é só uma soma em dicionário.
+    Uma thread grava os deltas acumulados a cada STATS_FLUSH_SECONDS (e no shutdown),
+    somando ao events_stats.json do dia com escrita atômica. Como só esta thread
+    escreve os arquivos, não há mais contagem perdida com eventos concorrentes.
+
+    Quebras gravadas: por_camera, por_grupo, por_label e por_hora (cada uma com
+    total/with_detections; por_label conta eventos aceitos em que o label apareceu).
+    O mesmo flush soma os contadores no rollup (rollups.py), usado nas consultas de intervalo.
+    """
+
+    def __init__(self, interval=STATS_FLUSH_SECONDS):
+        self.interval = interval
+        self.lock     = threading.Lock()
+        self.pending  = {}  # date_str -> delta
+        self.rollup   = {}  # (hora, dim, key, campo) -> quantidade
+        self.flush_lock = threading.Lock()
+        self.stopped  = threading.Event()
+        self.thread   = threading.Thread(target=self._run, daemon=True, name="stats-flush")
+        self.thread.start()
+
+    def add(self, date_str, field, camera_id=None, hour=None, groups=(), labels=()):
+        delta = {field: 1}
+        if camera_id is not None:
+            delta['por_camera'] = {str(camera_id): {field: 1}}
+        if hour is not None:
+            delta['por_hora'] = {f"{int(hour):02d}": {field: 1}}
+        if groups:
+            delta['por_grupo'] = {str(g): {field: 1} for g in groups}
+        if labels:
+            delta['por_label'] = {str(label): {field: 1} for label in set(labels)}
+        moment = datetime.strptime(date_str, "%Y-%m-%d").replace(hour=int(hour if hour is not None else time.localtime().tm_hour))
+        dims = [("*", "*")]
+        if camera_id is not None:
+            dims.append(("camera", str(camera_id)))
+        dims += [("grupo", str(g)) for g in groups or ()]
+        dims += [("label", str(label)) for label in set(labels or ())]
+        with self.lock:
+            _merge(self.pending.setdefault(date_str, {}), delta)
+            for dim, key in dims:
+                self.rollup[(moment, dim, key, field)] = self.rollup.get((moment, dim, key, field), 0) + 1
+
+    def flush(self):
+        """Grava os deltas pendentes; seguro para chamar de qualquer thread."""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                rollup, self.rollup = self.rollup, {}
+            if rollup:
+                try:
+                    rollups.get_store().add(rollup)
+                except Exception:
+                    logging.exception("Erro ao atualizar o rollup de estatísticas.")
+            for date_str, delta in pending.items():
+                try:
+                    file_path = os.path.join(_ensure_stats_dir(date_str), 'events_stats.json')
+                except Exception:
+                    logging.exception(f"Erro ao preparar a pasta de estatísticas de {date_str}")
+                    continue
+                data = _load_stats(file_path)
+                _merge(data, delta)
+                data['last_updated'] = time.strftime("%Y-%m-%d %H:%M:%S")
+                _save_stats(file_path, data)
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join(timeout=self.interval)
+        self.flush()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Erro ao gravar estatísticas agregadas.")
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+def get_aggregator():
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None:
+            _aggregator = StatsAggregator()
+            atexit.register(_aggregator.stop)
+        return _aggregator
+
+def flush():
+    """Força a gravação do que está em memória (shutdown, resumo mensal)."""
+    if _aggregator is not None:
+        _aggregator.flush()
+
+def increment_total(date_str, camera_id=None, hour=None):
     """Incrementa total de eventos gerados no dia."""
-    stats_dir = _ensure_stats_dir(date_str)
-    file_path = os.path.join(stats_dir, 'events_stats.json')
-    data = _load_stats(file_path)
-    data['total'] = data.get('total', 0) + 1
-    data['last_updated'] = time.strftime("%Y-%m-%d %H:%M:%S")
-    _save_stats(file_path, data)
-
-def increment_with_detections(date_str):
+    get_aggregator().add(date_str, 'total', camera_id, hour)
+
+def increment_with_detections(date_str, camera_id=None, hour=None, groups=(), labels=()):
     """Incrementa contagem de eventos que tiveram ao menos uma detecção."""
-    stats_dir = _ensure_stats_dir(date_str)
-    file_path = os.path.join(stats_dir, 'events_stats.json')
-    data = _load_stats(file_path)
-    data['with_detections'] = data.get('with_detections', 0) + 1
-    data['last_updated'] = time.strftime("%Y-%m-%d %H:%M:%S")
-    _save_stats(file_path, data)
+    get_aggregator().add(date_str, 'with_detections', camera_id, hour, groups, labels)
 
 def generate_monthly_summary(year: str, month: str):
-    """(inalterado)"""
+    """
+    Grava Stats/<ano>/<mês>/<ano>_<mês>_summary.json. Descarrega o agregador e lê os
+    totais e as quebras por_camera/por_grupo/por_label do rollup; para meses anteriores
+    ao rollup, soma e mescla os events_stats.json de cada dia.
+    """
+    flush()  # inclui os contadores ainda em memória
     month_num = str(int(month))
     month_dir = os.path.join(OUTPUT_DIR, 'Stats', year, month_num)
     if not os.path.isdir(month_dir):
         logging.warning(f"Stats: pasta do mês não existe: {month_dir}")
         return
 
-    total = 0
-    with_det = 0
-    for day in os.listdir(month_dir):
-        stat_file = os.path.join(month_dir, day, 'events_stats.json')
-        if os.path.isfile(stat_file):
-            data = _load_stats(stat_file)
-            total  += data.get('total', 0)
-            with_det += data.get('with_detections', 0)
+    try:
+        from_rollup = rollups.get_store().month_summary(year, month)
+    except Exception:
+        logging.exception("Erro ao consultar o rollup; somando os arquivos diários.")
+        from_rollup = None
+
+    if from_rollup is not None:
+        breakdowns = from_rollup
+    else:
+        # Meses anteriores ao rollup: soma os arquivos de cada dia
+        breakdowns = {'total_events': 0, 'with_detections': 0}
+        for day in os.listdir(month_dir):
+            stat_file = os.path.join(month_dir, day, 'events_stats.json')
+            if os.path.isfile(stat_file):
+                data = _load_stats(stat_file)
+                breakdowns['total_events']    += data.get('total', 0)
+                breakdowns['with_detections'] += data.get('with_detections', 0)
+                _merge(breakdowns, {k: v for k, v in data.items() if k.startswith('por_') and k != 'por_hora'})
 
     summary = {
         'year': year,
         'month': month_num,
-        'total_events': total,
-        'with_detections': with_det,
         'generated_at': time.strftime("%Y-%m-%d %H:%M:%S")
     }
+    summary.update(breakdowns)
     out_path = os.path.join(month_dir, f"{year}_{month_num}_summary.json")
     try:
         with open(out_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,58 @@
+import os
+import sys
+import types
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import config  # noqa: F401
+except Exception:
+    # Fora do servidor (sem os volumes/logs do ZM): só o que o rollups.py lê do config
+    _tmp = tempfile.mkdtemp()
+    config = types.ModuleType("config")
+    config.OUTPUT_DIR = _tmp
+    config.ROLLUP_DB  = os.path.join(_tmp, "Stats", "rollups.sqlite3")
+    sys.modules["config"] = config
+
+from rollups import align, cover, _next, LEVELS
+
+def _span(level, bucket):
+    start = datetime.strptime(bucket, {"hour": "%Y-%m-%d %H", "day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}[level])
+    return start, _next(level, start)
+
+def _assert_exact_cover(start, end):
+    buckets = cover(start, end)
+    cursor = start
+    for level, bucket in buckets:
+        assert level in LEVELS
+        first, following = _span(level, bucket)
+        assert first == cursor
+        cursor = following
+    assert cursor == end
+
+def test_cover_every_day_of_a_leap_year():
+    day = datetime(2024, 1, 1)
+    while day.year == 2024:
+        # Janela padrão da API (24 h) e intervalos de vários dias a partir de cada dia
+        for hours in (24, 24 * 3, 24 * 40):
+            _assert_exact_cover(day, day + timedelta(hours=hours))
+        _assert_exact_cover(day + timedelta(hours=13), day + timedelta(hours=13 + 24))
+        day += timedelta(days=1)
+
+def test_cover_uses_coarse_buckets():
+    assert cover(datetime(2024, 1, 1), datetime(2025, 1, 1)) == [("year", "2024")]
+    assert cover(datetime(2024, 2, 28), datetime(2024, 3, 2)) == [
+        ("day", "2024-02-28"), ("day", "2024-02-29"), ("day", "2024-03-01"),
+    ]
+    assert cover(datetime(2024, 1, 31), datetime(2024, 3, 1)) == [("day", "2024-01-31"), ("month", "2024-02")]
+
+def test_align_matches_the_summed_hours():
+    end = datetime(2024, 5, 10, 14, 37)
+    start, aligned_end = align(end - timedelta(hours=24), end)
+    assert (start, aligned_end) == (datetime(2024, 5, 9, 14), datetime(2024, 5, 10, 15))
+    assert len(cover(start, aligned_end)) == len(cover(end - timedelta(hours=24), end)) == 25
+    # Já alinhado: não muda, e as últimas 24 h inteiras são 24 baldes de hora
+    assert align(datetime(2024, 5, 9, 15), datetime(2024, 5, 10, 15)) == (datetime(2024, 5, 9, 15), datetime(2024, 5, 10, 15))
+    assert len(cover(datetime(2024, 5, 9, 15), datetime(2024, 5, 10, 15))) == 24
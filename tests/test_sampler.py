@@ -0,0 +1,47 @@
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import config
+except Exception:
+    # Fora do servidor (sem os volumes/logs do ZM): só o que o sampler.py lê do config
+    config = types.ModuleType("config")
+    sys.modules["config"] = config
+for _name, _value in {"FRAME_STRIDE": 7, "MIN_DETECTION_FRAMES": 3, "ADAPTIVE_SAMPLING": True, "SAMPLING_COARSE_FACTOR": 3}.items():
+    if not hasattr(config, _name):
+        setattr(config, _name, _value)
+
+from sampler import AdaptiveSampler, StreamSampler
+
+FRAMES = [f"f{i}" for i in range(43)]
+HITS = {"f28", "f35", "f42"}
+
+def _run(sampler, batch_size):
+    seen = []
+    while True:
+        batch = sampler.take(batch_size)
+        if not batch:
+            return seen
+        for frame in batch:
+            seen.append(frame)
+            sampler.report(frame in HITS, frame)
+
+def test_take_refines_around_hits_reported_from_a_batch():
+    for batch_size in (1, 4):
+        sampler = AdaptiveSampler(FRAMES, stride=7, needed=3, adaptive=True)
+        seen = _run(sampler, batch_size)
+        # Grade grossa 0/21/42; o acerto em f42 refina para f35 e f28
+        assert sampler.accepted, batch_size
+        assert HITS <= set(seen), batch_size
+        assert sampler.calls == 5, batch_size
+
+def test_take_stops_once_settled():
+    sampler = AdaptiveSampler(FRAMES, stride=7, needed=3, adaptive=True)
+    assert _run(sampler, 4) and sampler.take(4) == []
+    stream = StreamSampler(iter(FRAMES), needed=1)
+    assert stream.take(2) == ["f0", "f1"]
+    stream.report(True, "f1")
+    assert stream.take(2) == []
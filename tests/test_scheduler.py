@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import queue
+import types
+import threading
+from collections import namedtuple
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import config
+except Exception:
+    # Fora do servidor (sem os volumes/logs do ZM): só o que o scheduler.py lê do config
+    config = types.ModuleType("config")
+    sys.modules["config"] = config
+for _name, _value in {"CAMERA_PRIORITIES": {}, "CAMERA_QUEUE_SIZE": 30, "MAX_EVENT_AGE_MINUTES": 5}.items():
+    if not hasattr(config, _name):
+        setattr(config, _name, _value)
+
+from scheduler import FairScheduler
+
+Job = namedtuple("Job", ["camera_id", "event_id", "enqueued_at", "start_time"])
+
+def _job(camera_id, event_id):
+    return Job(camera_id, event_id, time.time(), None)
+
+def test_blocking_put_fails_fast_when_the_camera_queue_is_full():
+    scheduler = FairScheduler(10, per_camera=2, priorities={})
+    scheduler.put(_job(1, 1))
+    scheduler.put(_job(1, 2))
+    started = time.monotonic()
+    with pytest.raises(queue.Full):
+        scheduler.put(_job(1, 3), block=True, timeout=5)
+    assert time.monotonic() - started < 1
+    # As outras câmeras continuam entrando
+    scheduler.put(_job(2, 1), block=True, timeout=5)
+    assert scheduler.depths() == {1: 2, 2: 1}
+
+def test_blocking_put_waits_for_room_in_the_total_queue():
+    scheduler = FairScheduler(1, per_camera=2, priorities={})
+    scheduler.put(_job(1, 1))
+    threading.Timer(0.1, scheduler.get).start()
+    scheduler.put(_job(2, 1), block=True, timeout=5)
+    assert scheduler.depths() == {2: 1}
@@ -0,0 +1,108 @@
+from config import TRACK_IOU_THRESHOLD, TRACK_CENTROID_RATIO, TRACK_MAX_GAP_FRAMES, TRACK_BEST_BY
+
+def _box(obj):
+    return (obj["x_min"], obj["y_min"], obj["x_max"], obj["y_max"])
+
+def _area(box):
+    return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+def iou(a, b):
+    inter = _area((max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])))
+    union = _area(a) + _area(b) - inter
+    return inter / union if union else 0.0
+
+def _centroid_distance(a, b):
+    """Distância entre centros, relativa à maior diagonal das duas caixas."""
+    ax, ay = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+    bx, by = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    diagonal = max(
+        ((a[2] - a[0]) ** 2 + (a[3] - a[1]) ** 2) ** 0.5,
+        ((b[2] - b[0]) ** 2 + (b[3] - b[1]) ** 2) ** 0.5,
+    )
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / diagonal if diagonal else float("inf")
+
+class Track:
+    """Um objeto seguido ao longo do evento; guarda só a melhor observação (frame + caixa)."""
+
+    def __init__(self, track_id, label):
+        self.id    = track_id
+        self.label = label
+        self.first = None
+        self.last  = None
+        self.count = 0
+        self.box   = None
+        self.best  = None  # (score, obj, frame, número do frame)
+
+    def observe(self, number, obj, frame, best_by=TRACK_BEST_BY):
+        self.first = number if self.first is None else min(self.first, number)
+        self.last  = number if self.last is None else max(self.last, number)
+        self.count += 1
+        self.box = _box(obj)
+        score = _area(self.box) if best_by == "area" else obj.get("confidence", 0)
+        if self.best is None or score > self.best[0]:
+            self.best = (score, obj, frame, number)
+
+    def gap(self, number):
+        # O amostrador adaptativo visita frames fora de ordem: mede a distância até o intervalo já visto
+        if self.first <= number <= self.last:
+            return 0
+        return min(abs(number - self.first), abs(number - self.last))
+
+    def summary(self):
+        _, obj, _, number = self.best
+        return {
+            "id":             self.id,
+            "label":          self.label,
+            "primeiro_frame": self.first,
+            "ultimo_frame":   self.last,
+            "frames":         self.count,
+            "melhor_frame":   number,
+            "confianca":      round(obj.get("confidence", 0) * 100, 2),
+        }
+
+class ObjectTracker:
+    """
+    Rastreador leve por evento (IoU, com distância entre centros como segunda chance).
+    Cada detecção é associada ao rastro do mesmo label com maior sobreposição; sem
+    par, abre um rastro novo. Assim os recortes gravados escalam com o número de
+    objetos distintos, não com o número de frames analisados.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, centroid_ratio=TRACK_CENTROID_RATIO,
+                 max_gap=TRACK_MAX_GAP_FRAMES, best_by=TRACK_BEST_BY):
+        self.iou_threshold  = iou_threshold
+        self.centroid_ratio = centroid_ratio
+        self.max_gap        = max_gap
+        self.best_by        = best_by
+        self.tracks         = []
+
+    def update(self, number, objects, frame):
+        """Associa as detecções (dicts com label/confidence/caixa) de um frame aos rastros."""
+        pairs = []
+        for d, obj in enumerate(objects):
+            box = _box(obj)
+            for t, track in enumerate(self.tracks):
+                if track.label != obj["label"] or track.gap(number) > self.max_gap:
+                    continue
+                overlap = iou(track.box, box)
+                distance = _centroid_distance(track.box, box)
+                if overlap >= self.iou_threshold or distance <= self.centroid_ratio:
+                    pairs.append((-overlap, distance, d, t))
+
+        # Guloso pelo melhor par; cada rastro recebe no máximo uma detecção por frame
+        used_objects, used_tracks = set(), set()
+        for _, _, d, t in sorted(pairs):
+            if d in used_objects or t in used_tracks:
+                continue
+            used_objects.add(d)
+            used_tracks.add(t)
+            self.tracks[t].observe(number, objects[d], frame, self.best_by)
+
+        for d, obj in enumerate(objects):
+            if d not in used_objects:
+                track = Track(len(self.tracks) + 1, obj["label"])
+                track.observe(number, obj, frame, self.best_by)
+                self.tracks.append(track)
+
+    def summaries(self):
+        return [track.summary() for track in self.tracks]
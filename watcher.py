@@ -3,25 +3,108 @@ import time
 import re
 import logging
 import json
+import threading
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 from watchdog.observers import Observer
+from watchdog.observers.api import ObservedWatch
 from watchdog.events import FileSystemEventHandler
-from config import ZM_CACHE_DIR, CLEANUP_INTERVAL_MINUTES, IA_MONITORING_FILE, MAX_EVENT_AGE_MINUTES
-from db import get_active_monitor_ids, get_event_data
+from config import ZM_CACHE_DIR, SHED_BACKLOG_THRESHOLD, IA_MONITORING_FILE, MAX_EVENT_AGE_MINUTES, STREAMING_MODE, EVENT_DISCOVERY, FRAME_STRIDE
+from db import get_active_monitor_ids, get_event_data, monitor_cache
 from processor import process_event, load_processed
 import stats
-from cleaner import run_cleanup 
+from cleaner import start_cleaner
+from retention import start_retention, get_usage, record_zm_event
+from filesystem import get_event_path
+from pipeline import EventPipeline, stage, try_stage
+from discovery import EventPoller
+from catchup import start_catchup
+from deepstack_client import get_client
+import prefilter
+from detectors import cache_stats
+from artifacts import get_writer
 
 # Permissões para que o lockdown possa manipular os arquivos
 os.umask(0o002)
 
+class WatchScheduler:
+    """
+    Mantém watches NÃO recursivos apenas onde podem surgir eventos de hoje:
+    <ZM_CACHE_DIR>/<camera> (para ver a pasta do dia ser criada) e
+    <ZM_CACHE_DIR>/<camera>/<hoje> de cada monitor ativo. `sync` rotaciona os
+    watches na virada do dia e quando o conjunto de monitores muda, de modo que
+    o custo não depende do histórico guardado no volume.
+    """
+
+    def __init__(self, observer, handler, base):
+        self.observer = observer
+        self.handler  = handler
+        self.base     = base
+        self.watches  = {}
+        self._lock    = threading.Lock()
+
+    def sync(self, monitor_ids, catch_up=True):
+        today  = time.strftime("%Y-%m-%d")
+        wanted = []
+        for cam_id in monitor_ids:
+            cam_path = os.path.join(self.base, str(cam_id))
+            wanted.append(cam_path)
+            wanted.append(os.path.join(cam_path, today))
+
+        # Chamadas ao observer ficam fora do _lock: o watchdog segura o lock interno dele
+        # enquanto roda on_created, que por sua vez chama add() (ordem inversa = deadlock)
+        with self._lock:
+            stale = [(path, self.watches.pop(path)) for path in set(self.watches) - set(wanted)]
+        for path, watch in stale:
+            self._unschedule(path, watch)
+        for path in wanted:
+            self.add(path, catch_up)
+
+    def add(self, path, catch_up=True):
+        """Agenda o watch se a pasta existir. Se for uma pasta de dia, enfileira eventos criados antes do watch."""
+        with self._lock:
+            if path in self.watches or not os.path.isdir(path):
+                return
+            reservation = self.watches[path] = object()  # outra thread não agenda o mesmo caminho
+        try:
+            watch = self.observer.schedule(self.handler, path, recursive=False)
+        except OSError:
+            with self._lock:
+                if self.watches.get(path) is reservation:
+                    del self.watches[path]
+            logging.exception(f"Falha ao agendar watch em {path}")
+            return
+        with self._lock:
+            removed = self.watches.get(path) is not reservation  # sync removeu a reserva enquanto agendávamos
+            if not removed:
+                self.watches[path] = watch
+        if removed:
+            self._unschedule(path, watch)
+            return
+        if os.path.dirname(os.path.dirname(path)) == self.base:
+            logging.info(f"➕ Watch agendado em: {path}")
+            if catch_up:
+                self.handler.submit_existing(path)
+
+    def _unschedule(self, path, watch):
+        if not isinstance(watch, ObservedWatch):
+            return  # ainda sendo agendado: o próprio add() desfaz ao ver a reserva removida
+        try:
+            self.observer.unschedule(watch)
+        except (KeyError, OSError):
+            pass  # pasta já removida (ex.: limpeza), o watch morreu junto
+        logging.info(f"➖ Watch removido de: {path}")
+
 class NewEventHandler(FileSystemEventHandler):
     def __init__(self, processed_events, base, zm_monitor_ids):
         self.processed_events = processed_events
         self.base             = base
         self.ZMMOIDS          = zm_monitor_ids 
+        self.pipeline         = EventPipeline(self.handle_event, on_drop=self.drop_event)
+        self.scheduler        = None
 
     def on_created(self, event):
+        # Roda na thread do watchdog: apenas interpreta o caminho e enfileira
         if not event.is_directory:
             return
 
@@ -29,6 +112,12 @@ class NewEventHandler(FileSystemEventHandler):
             rel_path = os.path.relpath(event.src_path, self.base)
             parts = rel_path.split(os.sep)
 
+            # Pasta do dia criada (<camera>/<data>): passa a vigiar se for de hoje
+            if len(parts) == 2 and self.scheduler:
+                if parts[0].isdigit() and parts[1] == time.strftime("%Y-%m-%d"):
+                    self.scheduler.add(event.src_path)
+                return
+
             if len(parts) == 3:
                 camera_id_str, date_str, event_id_str = parts
                 
@@ -37,50 +126,98 @@ class NewEventHandler(FileSystemEventHandler):
                 if date_str != today_zm:
                     return
 
-                # --- FILTRO DE TEMPO REAL ---
-                event_id = int(event_id_str)
-                start_time = get_event_data(event_id)
-                
-                if start_time:
-                    age = datetime.now() - start_time
-                    # Se for mais velho que o limite, marca como processado e pula (não gasta IA)
-                    if age > timedelta(minutes=MAX_EVENT_AGE_MINUTES):
-                        key = (str(camera_id_str), str(event_id_str))
-                        if key not in self.processed_events:
-                            self.processed_events.add(key)
-                        return
-
                 if camera_id_str.isdigit() and re.match(r"\d{4}-\d{2}-\d{2}$", date_str) and event_id_str.isdigit():
-                    cam_id = int(camera_id_str)
-
-                    if cam_id not in self.ZMMOIDS:
-                        current_active_ids = get_active_monitor_ids()
-                        if cam_id in current_active_ids:
-                            self.ZMMOIDS = current_active_ids 
-
-                    if cam_id in self.ZMMOIDS:
-                        logging.info(f"✔️ Novo evento detectado: Cam {cam_id}, Evento {event_id_str}")
-                        stats.increment_total(date_str)
-                        time.sleep(2) 
-                        process_event(cam_id, date_str, event_id, self.processed_events, start_time)
+                    self.pipeline.submit(int(camera_id_str), date_str, int(event_id_str))
         except Exception:
             logging.exception(f"Erro ao processar: {event.src_path}")
 
+    def submit_existing(self, day_path):
+        """Enfileira eventos recentes que já existiam na pasta do dia quando o watch foi agendado."""
+        camera_id_str, date_str = os.path.relpath(day_path, self.base).split(os.sep)
+        cutoff = time.time() - MAX_EVENT_AGE_MINUTES * 60
+        try:
+            with os.scandir(day_path) as it:
+                for entry in it:
+                    if entry.is_dir() and entry.name.isdigit() and entry.stat().st_mtime >= cutoff:
+                        key = (camera_id_str, entry.name)
+                        if key not in self.processed_events:
+                            self.pipeline.submit(int(camera_id_str), date_str, int(entry.name))
+        except OSError:
+            logging.exception(f"Erro ao listar {day_path}")
+
+    def drop_event(self, job):
+        """Evento vencido na fila: marca como processado para não voltar pelo catch-up."""
+        self.processed_events.add((str(job.camera_id), str(job.event_id)))
+
+    def handle_event(self, job):
+        """Executado pelos workers do pipeline."""
+        cam_id, date_str, event_id = job.camera_id, job.date_str, job.event_id
+
+        # --- FILTRO DE TEMPO REAL ---
+        start_time = job.start_time
+        if start_time is None:
+            with stage("db"):
+                start_time = get_event_data(event_id)
+
+        if start_time:
+            age = datetime.now() - start_time
+            # Se for mais velho que o limite, marca como processado e pula (não gasta IA)
+            if age > timedelta(minutes=MAX_EVENT_AGE_MINUTES):
+                key = (str(cam_id), str(event_id))
+                if key not in self.processed_events:
+                    self.processed_events.add(key)
+                return
+
+        if cam_id not in self.ZMMOIDS:
+            with stage("db"):
+                current_active_ids = get_active_monitor_ids(refresh=True)
+            if cam_id in current_active_ids:
+                self.ZMMOIDS = current_active_ids 
+
+        if cam_id in self.ZMMOIDS:
+            logging.info(f"✔️ Novo evento detectado: Cam {cam_id}, Evento {event_id} (espera na fila: {time.time() - job.enqueued_at:.1f}s)")
+            stats.increment_total(date_str, cam_id, hour=(start_time or datetime.now()).hour)
+            # Streaming prende o worker até o evento fechar: só com vaga em "stream", senão vai em lote
+            with try_stage("stream") if STREAMING_MODE else nullcontext(False) as streaming:
+                if not streaming:
+                    time.sleep(2) 
+                process_event(cam_id, date_str, event_id, self.processed_events, start_time,
+                              stride=FRAME_STRIDE * job.stride_factor, streaming=streaming)
+            record_zm_event(cam_id, date_str, get_event_path(event_id, cam_id, date_str))
+
 def start_daemon_watch():
+    monitor_cache.start()
     ZMMOIDS = get_active_monitor_ids()
     processed = load_processed()
     base = ZM_CACHE_DIR 
 
-    observer = Observer()
     handler  = NewEventHandler(processed, base, ZMMOIDS)
-    observer.schedule(handler, base, recursive=True)
-    observer.start()
-    logging.info(f"✅ Monitoramento iniciado em: {base}. Tempo Real Ativado.")
+    handler.pipeline.start()
+
+    observer, poller = None, None
+    if EVENT_DISCOVERY == "database":
+        poller = EventPoller(handler.pipeline)
+        poller.start()
+    else:
+        observer = Observer()
+        handler.scheduler = WatchScheduler(observer, handler, base)
+        observer.start()
+        # O que já existia antes do start fica por conta do catch-up abaixo
+        handler.scheduler.sync(ZMMOIDS, catch_up=False)
+        logging.info(f"✅ Monitoramento iniciado em: {base} ({len(handler.scheduler.watches)} watches). Tempo Real Ativado.")
+
+    # Limpeza em thread própria; pausa enquanto a fila de eventos estiver acumulando
+    busy = lambda: handler.pipeline.queue.qsize() >= SHED_BACKLOG_THRESHOLD
+    start_cleaner(should_yield=busy, on_removed=get_usage().forget)
+    # Cotas por câmera e marcas d'água de disco, a partir do índice de uso
+    start_retention(should_yield=busy)
+
+    # Eventos criados enquanto o daemon estava parado
+    start_catchup(handler.pipeline, ZMMOIDS, processed)
 
     counter    = 0
     last_year  = time.strftime("%Y")
     last_month = time.strftime("%m")
-    last_cleanup_time = time.time() 
 
     try:
         while True:
@@ -93,24 +230,32 @@ def start_daemon_watch():
                 stats.generate_monthly_summary(last_year, last_month)
                 last_year, last_month = now_year, now_month
 
-            if (time.time() - last_cleanup_time) > (CLEANUP_INTERVAL_MINUTES * 60):
-                try:
-                    run_cleanup()
-                except:
-                    logging.exception("Erro na limpeza.")
-                last_cleanup_time = time.time()
+            handler.pipeline.expire()
 
             if counter >= 20:
                 try:
                     current_ids = get_active_monitor_ids()
                     handler.ZMMOIDS = current_ids 
+                    if handler.scheduler:
+                        # Também cobre a virada do dia
+                        handler.scheduler.sync(current_ids)
                     with open(IA_MONITORING_FILE, 'w', encoding='utf-8') as f:
                         json.dump(current_ids, f)
                     logging.info(f"⏳ Monitorando IDs: {current_ids}")
+                    logging.info(f"📥 Pipeline: {handler.pipeline.snapshot()}")
+                    logging.info(f"🧠 DeepStack: {get_client().snapshot()}")
+                    logging.info(f"🎞 Pré-filtro: {prefilter.counters()}")
+                    logging.info(f"🗃 Cache de inferência: {cache_stats()}")
                 except Exception:
                     logging.exception("Erro ao atualizar monitoramento.")
                 counter = 0
 
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
\ No newline at end of file
+        if observer:
+            observer.stop()
+            observer.join()
+        if poller:
+            poller.stop()
+    handler.pipeline.stop()
+    get_writer().flush()
+    stats.flush()
\ No newline at end of file